@@ -1,3 +1,16 @@
 """
 Dependency overrides and shared resources.
 """
+import httpx
+import redis.asyncio as redis
+from fastapi import Request
+
+
+def get_redis(request: Request) -> redis.Redis:
+    """Return the Redis client created in the app lifespan."""
+    return request.app.state.redis
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Return the shared async HTTP client created in the app lifespan."""
+    return request.app.state.http
@@ -1,11 +1,35 @@
 """
 Entrypoint for FastAPI app.
 """
+from contextlib import asynccontextmanager
+
+import httpx
+import redis.asyncio as redis
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from prometheus_fastapi_instrumentator import Instrumentator
+from core.config import settings
 from .routers import health, predict, streams, alerts, models
 
-app = FastAPI(title="Sentinel-Crime API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared clients are created once per process so requests reuse pooled
+    # connections instead of paying connection setup on every call
+    app.state.redis = redis.from_url(settings.REDIS_URL, max_connections=50)
+    app.state.http = httpx.AsyncClient()
+    try:
+        yield
+    finally:
+        await app.state.http.aclose()
+        await app.state.redis.aclose()
+
+
+app = FastAPI(
+    title="Sentinel-Crime API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Routers
 app.include_router(health.router)
@@ -16,3 +40,11 @@ app.include_router(alerts.router)
 
 # Metrics
 Instrumentator().instrument(app).expose(app)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Pin the C-backed loop and HTTP parser instead of relying on "auto",
+    # so a missing uvloop/httptools install fails loudly
+    uvicorn.run("api.main:app", host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
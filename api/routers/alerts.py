@@ -2,7 +2,7 @@ from fastapi import APIRouter, WebSocket
 
 router = APIRouter()
 
-@router.get("/alerts/ws")
+@router.websocket("/alerts/ws")
 async def alerts_ws(websocket: WebSocket):
     # TODO: Implement WebSocket for alerts
     await websocket.accept()
@@ -3,6 +3,6 @@ from fastapi import APIRouter
 router = APIRouter()
 
 @router.get("/health")
-def health_check():
+async def health_check():
     """Liveness/readiness probe."""
     return {"status": "ok"}
@@ -8,7 +8,7 @@ class FrameRequest(BaseModel):
     image_url: Optional[str] = None
 
 @router.post("/predict/frame")
-def predict_frame(file: UploadFile = File(None), req: FrameRequest = None):
+async def predict_frame(file: UploadFile = File(None), req: FrameRequest = None):
     """Predict crime in a single frame."""
     # TODO: Implement frame prediction
     return {"label": "theft", "probs": {"theft": 0.9}}
@@ -19,7 +19,7 @@ class VideoRequest(BaseModel):
     rtsp: Optional[str] = None
 
 @router.post("/predict/video")
-def predict_video(req: VideoRequest):
+async def predict_video(req: VideoRequest):
     """Enqueue video for async analysis."""
     # TODO: Enqueue job
     return {"job_id": "job123"}
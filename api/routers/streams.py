@@ -11,21 +11,21 @@ class StreamRegister(BaseModel):
     active: bool = False
 
 @router.post("/streams/register")
-def register_stream(req: StreamRegister):
+async def register_stream(req: StreamRegister):
     # TODO: Register stream
     return {"stream_id": 1}
 
 @router.post("/streams/{id}/start")
-def start_stream(id: int):
+async def start_stream(id: int):
     # TODO: Start stream
     return {"status": "started"}
 
 @router.post("/streams/{id}/stop")
-def stop_stream(id: int):
+async def stop_stream(id: int):
     # TODO: Stop stream
     return {"status": "stopped"}
 
 @router.get("/streams/{id}/status")
-def stream_status(id: int):
+async def stream_status(id: int):
     # TODO: Return stream status
     return {"fps": 2, "last_frame_time": None, "last_alert": None, "errors": []}
@@ -3,19 +3,55 @@ Backend Authentication System using SQLAlchemy and SQLite
 Provides user management, password hashing, and authentication
 """
 
-from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy import create_engine, event, Column, Integer, String
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from werkzeug.security import generate_password_hash, check_password_hash
+from collections import OrderedDict
+from threading import Lock
+import hashlib
+import hmac
 import os
+import secrets
+import time
 
 # Database Configuration
 DATABASE_URL = "sqlite:///users.db"
+# SQLite runs one writer at a time, so the default pool (5 connections) is plenty
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Per-connection settings: synchronous=NORMAL (safe under WAL) and a 64 MB page cache.
+    
+    WAL journaling itself is persistent and is switched on once by init_db().
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
+
+# Password hashing parameters (PBKDF2-HMAC via hashlib/OpenSSL)
+PBKDF2_HASH_NAME = "sha256"
+PBKDF2_ITERATIONS = 600_000
+SALT_LENGTH = 16
+
+# Random salt/digest pair verified against when a username does not exist,
+# so unknown users cost the same PBKDF2 work as a wrong password
+_DUMMY_SALT = secrets.token_hex(SALT_LENGTH // 2)
+_DUMMY_DIGEST = secrets.token_hex(32)
+
+# Successful-login cache: (username, sha256(password)) -> (user_id, hashed_password, expires_at)
+AUTH_CACHE_TTL = 300.0
+AUTH_CACHE_MAXSIZE = 1024
+_auth_cache: OrderedDict = OrderedDict()
+_auth_cache_lock = Lock()
+
+
 # ============================================================================
 # User Model Definition
 # ============================================================================
@@ -26,7 +62,7 @@ class User(Base):
     Attributes:
         id (int): Primary key, auto-incremented
         username (str): Unique username for login
-        hashed_password (str): Securely hashed password using Werkzeug
+        hashed_password (str): Securely hashed password (PBKDF2-HMAC-SHA256)
         role (str): User role - either 'admin' or 'user' (default: 'user')
     """
     __tablename__ = "users"
@@ -40,15 +76,121 @@ class User(Base):
         return f"<User(id={self.id}, username={self.username}, role={self.role})>"
 
 
+# ============================================================================
+# Password Hashing
+# ============================================================================
+def _hash_password(password: str) -> str:
+    """
+    Hash a password with PBKDF2-HMAC using a random salt.
+
+    The result uses the ``pbkdf2:<hash>:<iterations>$<salt>$<hex digest>``
+    layout, so hashes created by the previous Werkzeug-based implementation
+    remain verifiable.
+
+    Args:
+        password (str): Plain text password
+
+    Returns:
+        str: Encoded password hash
+    """
+    salt = secrets.token_hex(SALT_LENGTH // 2)
+    digest = hashlib.pbkdf2_hmac(
+        PBKDF2_HASH_NAME, password.encode("utf-8"), salt.encode("utf-8"), PBKDF2_ITERATIONS
+    )
+    return f"pbkdf2:{PBKDF2_HASH_NAME}:{PBKDF2_ITERATIONS}${salt}${digest.hex()}"
+
+
+def _verify_password(hashed_password: str, password: str) -> bool:
+    """
+    Check a plain text password against a hash produced by _hash_password.
+
+    Args:
+        hashed_password (str): Encoded password hash
+        password (str): Plain text password to verify
+
+    Returns:
+        bool: True if the password matches, False otherwise
+    """
+    try:
+        method, salt, expected = hashed_password.split("$", 2)
+        scheme, hash_name, iterations = method.split(":")
+        if scheme != "pbkdf2":
+            return False
+        digest = hashlib.pbkdf2_hmac(
+            hash_name, password.encode("utf-8"), salt.encode("utf-8"), int(iterations)
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def _dummy_hash() -> str:
+    """Build a never-matching hash using the current PBKDF2 parameters."""
+    return f"pbkdf2:{PBKDF2_HASH_NAME}:{PBKDF2_ITERATIONS}${_DUMMY_SALT}${_DUMMY_DIGEST}"
+
+
+# ============================================================================
+# Authentication Cache
+# ============================================================================
+def _auth_cache_key(username: str, password: str) -> tuple:
+    """Build a cache key without keeping the plain text password in memory."""
+    return (username, hashlib.sha256(password.encode("utf-8")).digest())
+
+
+def _auth_cache_get(key: tuple) -> tuple | None:
+    """
+    Look up a cached successful login.
+
+    Returns:
+        tuple: (user_id, hashed_password) if a live entry exists, None otherwise
+    """
+    with _auth_cache_lock:
+        entry = _auth_cache.get(key)
+        if entry is None:
+            return None
+        user_id, hashed_password, expires_at = entry
+        if expires_at < time.monotonic():
+            del _auth_cache[key]
+            return None
+        _auth_cache.move_to_end(key)
+        return user_id, hashed_password
+
+
+def _auth_cache_put(key: tuple, user: User) -> None:
+    """Remember a successful login, evicting the least recently used entry when full."""
+    with _auth_cache_lock:
+        _auth_cache[key] = (user.id, user.hashed_password, time.monotonic() + AUTH_CACHE_TTL)
+        _auth_cache.move_to_end(key)
+        while len(_auth_cache) > AUTH_CACHE_MAXSIZE:
+            _auth_cache.popitem(last=False)
+
+
+def _auth_cache_invalidate(username: str) -> None:
+    """Drop every cached login for a username."""
+    with _auth_cache_lock:
+        for key in [k for k in _auth_cache if k[0] == username]:
+            del _auth_cache[key]
+
+
 # ============================================================================
 # Database Initialization
 # ============================================================================
-def init_db():
+def init_db(bind=None):
     """
     Initialize database and create all tables if they don't exist.
     Safe to call multiple times - only creates missing tables.
+    
+    Also switches the database file to WAL journaling, so readers don't
+    block on a writer. The mode is stored in the file, so this only has
+    to happen once.
+    
+    Args:
+        bind (Engine): Engine to initialize (default: the application engine)
     """
-    Base.metadata.create_all(bind=engine)
+    bind = bind if bind is not None else engine
+    Base.metadata.create_all(bind=bind)
+    with bind.connect() as connection:
+        connection.exec_driver_sql("PRAGMA journal_mode=WAL")
     print("✓ Database initialized successfully")
 
 
@@ -80,13 +222,8 @@ def create_user(db: Session, username: str, password: str, role: str = "user") -
     if role not in ["admin", "user"]:
         raise ValueError(f"Invalid role: {role}. Must be 'admin' or 'user'")
     
-    # Check if user already exists
-    existing_user = db.query(User).filter(User.username == username).first()
-    if existing_user:
-        raise ValueError(f"Username '{username}' already exists")
-    
-    # Hash password using Werkzeug
-    hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+    # Hash password using PBKDF2
+    hashed_password = _hash_password(password)
     
     # Create new user object
     new_user = User(
@@ -95,9 +232,14 @@ def create_user(db: Session, username: str, password: str, role: str = "user") -
         role=role
     )
     
-    # Add to session and commit
+    # Add to session and commit; the UNIQUE constraint on username rejects
+    # duplicates without a separate existence query
     db.add(new_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise ValueError(f"Username '{username}' already exists")
     db.refresh(new_user)
     
     return new_user
@@ -123,15 +265,27 @@ def authenticate_user(db: Session, username: str, password: str) -> User | None:
         ...     print(f"Authenticated as {user.username}")
         >>> db.close()
     """
+    # Serve repeated logins from the cache to skip the PBKDF2 verification.
+    # The stored hash is compared so out-of-band password changes are honored.
+    cache_key = _auth_cache_key(username, password)
+    cached = _auth_cache_get(cache_key)
+    if cached is not None:
+        user_id, hashed_password = cached
+        user = db.get(User, user_id)
+        if user is not None and user.username == username and user.hashed_password == hashed_password:
+            return user
+        _auth_cache_invalidate(username)
+    
     # Retrieve user by username
     user = db.query(User).filter(User.username == username).first()
     
-    # Return None if user doesn't exist
-    if not user:
-        return None
+    # Verify password using PBKDF2; missing users are checked against a dummy
+    # hash so response time does not reveal whether the username exists
+    hashed_password = user.hashed_password if user is not None else _dummy_hash()
+    password_ok = _verify_password(hashed_password, password)
     
-    # Verify password using Werkzeug
-    if check_password_hash(user.hashed_password, password):
+    if user is not None and password_ok:
+        _auth_cache_put(cache_key, user)
         return user
     
     return None
@@ -189,12 +343,11 @@ def delete_user(db: Session, username: str) -> bool:
     Returns:
         bool: True if user was deleted, False if user not found
     """
-    user = db.query(User).filter(User.username == username).first()
-    if user:
-        db.delete(user)
-        db.commit()
-        return True
-    return False
+    deleted = db.query(User).filter(User.username == username).delete()
+    db.commit()
+    if deleted:
+        _auth_cache_invalidate(username)
+    return bool(deleted)
 
 
 def update_user_password(db: Session, username: str, new_password: str) -> bool:
@@ -209,12 +362,13 @@ def update_user_password(db: Session, username: str, new_password: str) -> bool:
     Returns:
         bool: True if password was updated, False if user not found
     """
-    user = db.query(User).filter(User.username == username).first()
-    if user:
-        user.hashed_password = generate_password_hash(new_password, method='pbkdf2:sha256')
-        db.commit()
-        return True
-    return False
+    updated = db.query(User).filter(User.username == username).update(
+        {User.hashed_password: _hash_password(new_password)}
+    )
+    db.commit()
+    if updated:
+        _auth_cache_invalidate(username)
+    return bool(updated)
 
 
 # ============================================================================
@@ -2,7 +2,8 @@
 import torch
 import numpy as np
 from PIL import Image
-import cv2
+from functools import lru_cache
+from threading import Lock
 from typing import Dict, List
 from .model_loader import model_loader, MODEL_PATH
 
@@ -17,32 +18,58 @@ except Exception as e:
 def bgr_to_pil(img: np.ndarray) -> Image.Image:
     """Convert BGR frame from OpenCV to PIL Image"""
     try:
-        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        return Image.fromarray(rgb)
+        # PIL's BGR raw decoder swaps channels while copying into the image,
+        # so no intermediate RGB array is materialized
+        h, w = img.shape[:2]
+        return Image.frombytes("RGB", (w, h), np.ascontiguousarray(img), "raw", "BGR")
     except Exception as e:
         raise ValueError(f"Failed to convert BGR to PIL: {e}")
 
+# Pinned host buffer that CPU batches are staged through on their way to CUDA.
+# bf16 matches the autocast dtype, so halving the copy loses nothing the model keeps.
+_pinned = None
+_pinned_free = None  # CUDA event recorded once the last upload out of _pinned is done
+_pinned_lock = Lock()
+
+def _to_device(pixel_values: torch.Tensor) -> torch.Tensor:
+    """Move a batch to the model device, uploading CPU batches to CUDA asynchronously"""
+    global _pinned, _pinned_free
+    if device.type != "cuda" or pixel_values.device.type == "cuda":
+        return pixel_values.to(device)
+    
+    with _pinned_lock:
+        if _pinned_free is not None:
+            _pinned_free.synchronize()
+        n = pixel_values.numel()
+        if _pinned is None or _pinned.numel() < n:
+            _pinned = torch.empty(n, dtype=torch.bfloat16, pin_memory=True)
+        staged = _pinned[:n].view(pixel_values.shape)
+        staged.copy_(pixel_values)
+        uploaded = staged.to(device, non_blocking=True)
+        _pinned_free = torch.cuda.Event()
+        _pinned_free.record()
+    return uploaded
+
+def _forward(pixel_values: torch.Tensor) -> torch.Tensor:
+    """Run the model on a (B, 3, H, W) batch and return softmax probabilities"""
+    pixel_values = _to_device(pixel_values).contiguous(memory_format=torch.channels_last)
+    use_amp = device.type == "cuda"
+    
+    # inference_mode skips autograd view/version tracking; bf16 autocast uses tensor cores on GPU
+    with torch.inference_mode(), torch.autocast(device.type, dtype=torch.bfloat16, enabled=use_amp):
+        outputs = model(pixel_values=pixel_values)
+    
+    return torch.nn.functional.softmax(outputs.logits.float(), dim=-1)
+
 def predict_frame(frame: np.ndarray, top_k: int = 3) -> Dict[str, float]:
     """Predict crime class for a single frame"""
     try:
         if frame is None or frame.size == 0:
             raise ValueError("Frame is empty or None")
         
-        pil_img = bgr_to_pil(frame)
-        inputs = processor(images=pil_img, return_tensors="pt")
-        inputs = {k: v.to(device) for k, v in inputs.items()}
-        
-        with torch.no_grad():
-            outputs = model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)[0]
+        probs = _forward(processor.preprocess_bgr([frame]))
         
-        topk = torch.topk(probs, k=min(top_k, len(probs)))
-        id2label = getattr(model.config, "id2label", None)
-        if id2label is None:
-            id2label = {i: str(i) for i in range(len(probs))}
-        
-        result = {id2label[int(idx.item())]: prob.item() for prob, idx in zip(topk.values, topk.indices)}
-        return result
+        return _topk_results(probs, top_k)[0]
     except Exception as e:
         raise RuntimeError(f"Prediction failed: {e}")
 
@@ -52,22 +79,44 @@ def predict_batch(frames: List[np.ndarray], top_k: int = 3) -> List[Dict[str, fl
         if not frames:
             return []
         
-        pil_imgs = [bgr_to_pil(f) for f in frames]
-        inputs = processor(images=pil_imgs, return_tensors="pt")
-        inputs = {k: v.to(device) for k, v in inputs.items()}
+        probs = _forward(processor.preprocess_bgr(frames))
         
-        with torch.no_grad():
-            outputs = model(**inputs)
-            probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
+        return _topk_results(probs, top_k)
+    except Exception as e:
+        raise RuntimeError(f"Batch prediction failed: {e}")
+
+def predict_batch_tensor(batch: np.ndarray, top_k: int = 3) -> List[Dict[str, float]]:
+    """Predict crime classes for a uint8 BGR batch of shape (B, H, W, 3), e.g. from iter_frame_batches"""
+    try:
+        if batch is None or len(batch) == 0:
+            return []
         
-        results = []
-        id2label = getattr(model.config, "id2label", None)
-        if id2label is None:
-            id2label = {i: str(i) for i in range(probs.shape[1])}
+        probs = _forward(processor.preprocess_bgr_batch(batch, device))
         
-        for p in probs:
-            topk = torch.topk(p, k=min(top_k, len(p)))
-            results.append({id2label[int(idx.item())]: prob.item() for prob, idx in zip(topk.values, topk.indices)})
-        return results
+        return _topk_results(probs, top_k)
     except Exception as e:
         raise RuntimeError(f"Batch prediction failed: {e}")
+
+def _topk_results(probs: torch.Tensor, top_k: int) -> List[Dict[str, float]]:
+    """Map each row of a (B, num_classes) probability tensor to its top-k labels"""
+    # One topk launch and one device-to-host copy for the whole batch
+    values, indices = torch.topk(probs, k=min(top_k, probs.shape[-1]), dim=-1)
+    values = values.cpu().tolist()
+    indices = indices.cpu().tolist()
+    
+    labels = _labels(probs.shape[-1])
+    
+    return [
+        {labels[idx]: prob for prob, idx in zip(row_values, row_indices)}
+        for row_values, row_indices in zip(values, indices)
+    ]
+
+def _labels(num_classes: int):
+    """Return the model's id2label mapping, or cached string ids when it has none"""
+    id2label = getattr(model.config, "id2label", None)
+    return id2label if id2label is not None else _fallback_labels(num_classes)
+
+@lru_cache(maxsize=None)
+def _fallback_labels(num_classes: int) -> tuple:
+    """String class ids ("0", "1", ...) built once per class count"""
+    return tuple(str(i) for i in range(num_classes))
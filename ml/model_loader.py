@@ -1,26 +1,55 @@
 
 # Optimized for local ViT model loading (no HuggingFace downloads)
 import torch
+import numpy as np
+import cv2
+from functools import lru_cache
 from threading import Lock
-from typing import Optional
+from typing import List, Optional
 import json
 from torchvision import transforms
 from PIL import Image
 
 MODEL_PATH = "model_crime_ucf.pth"
 
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+def _as_rgb_array(img) -> np.ndarray:
+    """View an RGB PIL image or ndarray as an (H, W, 3) uint8 array"""
+    if isinstance(img, Image.Image) and img.mode != "RGB":
+        img = img.convert("RGB")
+    return np.asarray(img)
+
 class SimpleImageProcessor:
     """Simple local image processor without HuggingFace dependencies"""
-    def __init__(self, image_size: int = 224):
+    def __init__(self, image_size: int = 224, device: Optional[torch.device] = None):
         self.image_size = image_size
+        self.device = torch.device(device) if device is not None else None
         self.transform = transforms.Compose([
             transforms.Resize((image_size, image_size)),
             transforms.ToTensor(),
             transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
+                mean=IMAGENET_MEAN,
+                std=IMAGENET_STD
             )
         ])
+        self.mean = torch.tensor(IMAGENET_MEAN).view(1, 3, 1, 1)
+        self.std = torch.tensor(IMAGENET_STD).view(1, 3, 1, 1)
+        # (scale, shift) per device so uint8 -> normalized is x * scale - shift
+        self._norm_cache = {}
+        # (x - 255*mean) * 1/(255*std) per RGB channel, applied after the BGR->RGB swap
+        self._blob_params = cv2.dnn.Image2BlobParams(
+            scalefactor=tuple(1.0 / (255.0 * s) for s in IMAGENET_STD),
+            size=(image_size, image_size),
+            mean=tuple(255.0 * m for m in IMAGENET_MEAN),
+            swapRB=True,
+            ddepth=cv2.CV_32F,
+        )
+        # Reusable uint8 staging buffer (pinned when uploading to CUDA)
+        self._buffer = None
+        self._upload_done = None
+        self._lock = Lock()
     
     def __call__(self, images=None, return_tensors: str = "pt"):
         if images is None:
@@ -30,10 +59,97 @@ class SimpleImageProcessor:
         if isinstance(images, Image.Image):
             images = [images]
         
-        processed = torch.stack([self.transform(img) for img in images])
+        # Every list resizes with cv2 on the CPU, whatever the device or sizes,
+        # so the same image always yields the same pixel values
+        device = self.device or torch.device("cpu")
+        with self._lock:
+            buf = self._staging_buffer(len(images))
+            buf_np = buf.numpy()
+            for i, img in enumerate(images):
+                self._resize_into(img, buf_np[i])
+            
+            pixel_values = buf.to(device, non_blocking=True)
+            if device.type == "cuda":
+                # The staging buffer must not be refilled before this upload finishes
+                self._upload_done = torch.cuda.Event()
+                self._upload_done.record()
+            
+            # float() copies out of the staging buffer before it is reused
+            pixel_values = pixel_values.permute(0, 3, 1, 2).float()
+        
+        scale, shift = self._normalization(device)
+        processed = pixel_values.mul_(scale).sub_(shift)
         
         return {"pixel_values": processed}
 
+    def _normalization(self, device: torch.device):
+        """Return cached (1/(255*std), mean/std) tensors on the given device"""
+        constants = self._norm_cache.get(device)
+        if constants is None:
+            scale = (1.0 / (255.0 * self.std)).to(device)
+            shift = (self.mean / self.std).to(device)
+            constants = self._norm_cache.setdefault(device, (scale, shift))
+        return constants
+
+    def _staging_buffer(self, batch_size: int) -> torch.Tensor:
+        """Return a (batch_size, S, S, 3) view of the uint8 staging buffer, growing it if needed"""
+        if self._upload_done is not None:
+            self._upload_done.synchronize()
+            self._upload_done = None
+        if self._buffer is None or self._buffer.shape[0] < batch_size:
+            pin = self.device is not None and self.device.type == "cuda"
+            self._buffer = torch.empty(
+                (batch_size, self.image_size, self.image_size, 3), dtype=torch.uint8, pin_memory=pin
+            )
+        return self._buffer[:batch_size]
+
+    def _resize_into(self, img, dst: np.ndarray) -> None:
+        """Resize an RGB PIL image or ndarray straight into a slot of the staging buffer"""
+        arr = _as_rgb_array(img)
+        h, w = arr.shape[:2]
+        if (h, w) == (self.image_size, self.image_size):
+            dst[...] = arr
+            return
+        shrinking = h > self.image_size or w > self.image_size
+        interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+        cv2.resize(arr, (self.image_size, self.image_size), dst=dst, interpolation=interpolation)
+
+    def preprocess_bgr(self, frames: List[np.ndarray]) -> torch.Tensor:
+        """
+        Turn BGR frames of any size into normalized (B, 3, S, S) pixel values.
+
+        cv2.dnn.blobFromImagesWithParams swaps channels, resizes, subtracts the
+        mean and scales each channel in a single native pass per frame, instead
+        of the cvtColor -> PIL -> Resize -> ToTensor -> Normalize chain.
+        """
+        blob = cv2.dnn.blobFromImagesWithParams(list(frames), self._blob_params)
+        return torch.from_numpy(blob)
+
+    def preprocess_bgr_batch(self, batch: np.ndarray, device=None) -> torch.Tensor:
+        """
+        Turn a uint8 BGR batch of shape (B, H, W, 3) into normalized pixel values.
+
+        The batch is uploaded once and converted to RGB, resized and normalized
+        with tensor ops on the target device, skipping the per-frame PIL path.
+        """
+        pixel_values = torch.from_numpy(np.ascontiguousarray(batch)).to(device or "cpu", non_blocking=True)
+        return self._resize_normalize(pixel_values, bgr=True)
+
+    def _resize_normalize(self, batch: torch.Tensor, bgr: bool) -> torch.Tensor:
+        """Resize and normalize a uint8 (B, H, W, 3) tensor with batched ops on its device"""
+        pixel_values = batch.permute(0, 3, 1, 2)
+        if bgr:
+            pixel_values = pixel_values.flip(1)
+        # Resizing is linear, so it can run on the 0-255 range before normalizing
+        pixel_values = pixel_values.float()
+        if pixel_values.shape[-2:] != (self.image_size, self.image_size):
+            pixel_values = torch.nn.functional.interpolate(
+                pixel_values, size=(self.image_size, self.image_size),
+                mode="bilinear", align_corners=False, antialias=True
+            )
+        scale, shift = self._normalization(pixel_values.device)
+        return pixel_values.mul_(scale).sub_(shift)
+
 class SimpleViTModel(torch.nn.Module):
     """Simple ViT model wrapper for local .pth loading"""
     def __init__(self):
@@ -44,47 +160,90 @@ class SimpleViTModel(torch.nn.Module):
         # Placeholder - will be replaced with actual model weights from .pth
         pass
 
+def _quantize(model: torch.nn.Module, quantize: str, device: torch.device) -> torch.nn.Module:
+    """
+    Quantize the Linear layers of model for inference on device.
+    
+    On CPU, int8 uses dynamic quantization, which halves weight traffic and
+    runs VNNI dot products. On CUDA, int8 and fp8 use torchao weight-only
+    quantization (fp8 needs Ada/Hopper tensor cores).
+    """
+    if device.type == "cpu":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    
+    try:
+        from torchao.quantization import quantize_, int8_weight_only, float8_weight_only
+    except ImportError as e:
+        raise RuntimeError(f"torchao is required for {quantize} quantization on CUDA (pip install torchao)") from e
+    
+    quantize_(model, int8_weight_only() if quantize == "int8" else float8_weight_only())
+    return model
+
 class ModelLoader:
-    _instance = None
-    _lock = Lock()
-
-    def __new__(cls):
-        if not cls._instance:
-            with cls._lock:
-                if not cls._instance:
-                    cls._instance = super().__new__(cls)
-                    cls._instance.model = None
-                    cls._instance.processor = None
-                    cls._instance.device = None
-        return cls._instance
-
-    def load(self, model_path: str = MODEL_PATH, device: Optional[str] = None):
+    def __init__(self):
+        self.model = None
+        self.processor = None
+        self.device = None
+
+    def load(
+        self,
+        model_path: str = MODEL_PATH,
+        device: Optional[str] = None,
+        compile_model: bool = False,
+        quantize: Optional[str] = None,
+    ):
         if self.model is not None:
             return self.model
         
+        if quantize not in (None, "int8", "fp8"):
+            raise ValueError(f"Unsupported quantization: {quantize}. Must be 'int8', 'fp8' or None")
+        
         self.device = torch.device(device if device else ("cuda" if torch.cuda.is_available() else "cpu"))
+        if quantize == "fp8" and self.device.type != "cuda":
+            raise ValueError("fp8 quantization is only supported on CUDA")
         
         try:
             # Load model state dict directly
             state_dict = torch.load(model_path, map_location=self.device)
             
-            # Initialize model and load weights
-            self.model = SimpleViTModel()
+            # Initialize model and load weights; nothing is cached on self until
+            # quantization and warmup have succeeded, so a failed load can be retried
+            model = SimpleViTModel()
             
             # Try to load state dict, handle missing keys gracefully
             try:
-                self.model.load_state_dict(state_dict)
+                model.load_state_dict(state_dict)
             except:
                 # If full state dict doesn't match, try partial load
                 for key in list(state_dict.keys()):
-                    if key in self.model.state_dict():
-                        self.model.state_dict()[key] = state_dict[key]
+                    if key in model.state_dict():
+                        model.state_dict()[key] = state_dict[key]
             
             # Setup processor for image preprocessing
-            self.processor = SimpleImageProcessor()
+            processor = SimpleImageProcessor(device=self.device)
             
-            self.model = self.model.to(self.device)
-            self.model.eval()
+            model = model.to(self.device, memory_format=torch.channels_last)
+            model.eval()
+            
+            if quantize is not None:
+                model = _quantize(model, quantize, self.device)
+            
+            if self.device.type == "cuda":
+                # Inputs are always S x S, so cuDNN can autotune once and reuse
+                # the fastest plan; TF32 matmuls are accurate enough for ViT
+                torch.backends.cudnn.benchmark = True
+                torch.set_float32_matmul_precision("high")
+            
+            if compile_model:
+                # Fuse attention/MLP kernels; warm up so compilation happens at load time
+                model = torch.compile(model, mode="reduce-overhead")
+            
+            if compile_model or self.device.type == "cuda":
+                # torch.compile fails lazily, on this first call
+                self._warmup(model, processor.image_size)
+            
+            self.model = model
+            self.processor = processor
             
         except FileNotFoundError:
             raise RuntimeError(f"Model file not found: {model_path}")
@@ -93,6 +252,15 @@ class ModelLoader:
         
         return self.model
 
+    def _warmup(self, model: torch.nn.Module, size: int):
+        """Run one dummy forward pass to trigger lazy compilation/autotuning"""
+        dummy = torch.zeros((1, 3, size, size), device=self.device).to(memory_format=torch.channels_last)
+        # Match the autocast used at inference so the tuned kernels are the ones reused
+        with torch.inference_mode(), torch.autocast(
+            self.device.type, dtype=torch.bfloat16, enabled=self.device.type == "cuda"
+        ):
+            model(pixel_values=dummy)
+
     def get_model(self):
         if self.model is None:
             raise RuntimeError("Model not loaded. Call load() first.")
@@ -106,4 +274,9 @@ class ModelLoader:
     def get_device(self):
         return self.device
 
-model_loader = ModelLoader()
+@lru_cache(maxsize=1)
+def get_loader() -> ModelLoader:
+    """Return the process-wide ModelLoader, creating it on first use."""
+    return ModelLoader()
+
+model_loader = get_loader()
@@ -1,30 +1,212 @@
 
-from collections import deque
-from typing import List, Dict
+from typing import List, Tuple
 import numpy as np
 
 class EMA:
-    """Exponential Moving Average for smoothing predictions"""
-    def __init__(self, alpha: float = 0.5, num_classes: int = 14):
+    """
+    Exponential Moving Average for smoothing predictions
+    
+    With adaptive=True, alpha is re-estimated every var_window updates as
+    2*var(smoothed) / (var(raw) + var(smoothed)) over the last var_window
+    frames, so stable segments are smoothed harder and transitions are
+    tracked faster. A window whose input barely varies (a constant score)
+    says nothing about noise and keeps the current alpha. Only per-frame
+    updates adapt; update_batch keeps alpha.
+    """
+    # Mean per-class variance of the raw input below which alpha is not re-estimated
+    MIN_ADAPT_VARIANCE = 1e-6
+    
+    def __init__(self, alpha: float = 0.5, num_classes: int = 14, adaptive: bool = False, var_window: int = 30):
         self.alpha = alpha
-        self.ema = np.zeros(num_classes)
+        # float32 state: probabilities don't need double precision, and
+        # 14 classes fit in two AVX registers
+        self.ema = np.zeros(num_classes, dtype=np.float32)
+        # Inputs are converted into this buffer, so updates allocate nothing
+        self._scratch = np.empty(num_classes, dtype=np.float32)
         self.initialized = False
+        self.adaptive = adaptive
+        if adaptive:
+            # Rolling (var_window, num_classes) histories of raw and smoothed probs
+            self._recent = np.empty((var_window, num_classes), dtype=np.float32)
+            self._smoothed = np.empty((var_window, num_classes), dtype=np.float32)
+            self._seen = 0
+
+    @property
+    def alpha(self) -> float:
+        return self._alpha
+
+    @alpha.setter
+    def alpha(self, value: float) -> None:
+        # Keep the decay factor next to alpha so updates don't recompute it
+        self._alpha = value
+        self._one_minus_alpha = 1.0 - value
 
     def update(self, probs: List[float]) -> List[float]:
-        probs_arr = np.asarray(probs, dtype=float)
+        return self.update_array(probs).tolist()
+
+    def update_array(self, probs) -> np.ndarray:
+        """
+        Same as update() but return the state array instead of a list.
+        
+        probs must have num_classes entries. The returned array is the EMA's
+        own buffer and changes on the next update; copy it to keep a snapshot.
+        """
+        np.copyto(self._scratch, probs)
+        if self.adaptive:
+            row = self._seen % len(self._recent)
+            self._recent[row] = self._scratch
+        if not self.initialized:
+            self.ema[...] = self._scratch
+            self.initialized = True
+        else:
+            # Update the state buffer in place instead of allocating a new one per frame
+            self.ema *= self._one_minus_alpha
+            self._scratch *= self._alpha
+            self.ema += self._scratch
+        if self.adaptive:
+            self._smoothed[row] = self.ema
+            self._seen += 1
+            if self._seen % len(self._recent) == 0:
+                self._adapt_alpha()
+        return self.ema
+
+    def _adapt_alpha(self) -> None:
+        """Re-estimate alpha from the per-class variances of the last window"""
+        var_raw = self._recent.var(axis=0).mean()
+        if var_raw < self.MIN_ADAPT_VARIANCE:
+            # both variances are ~0 here, which would pin alpha to its floor
+            # and leave the next real transition tracked with almost no response
+            return
+        var_smoothed = self._smoothed.var(axis=0).mean()
+        self.alpha = float(np.clip(2 * var_smoothed / (var_raw + var_smoothed + 1e-9), 0.01, 0.99))
+
+    def update_and_argmax(self, probs) -> Tuple[int, np.ndarray]:
+        """
+        Update the EMA and return (top label, state array) in one call.
+        
+        Callers that only need the smoothed label skip the list conversion
+        and reduce the state while it is still in cache. The array is the
+        live buffer, as with update_array().
+        """
+        ema = self.update_array(probs)
+        return int(ema.argmax()), ema
+
+    def update_batch(self, probs_seq: np.ndarray) -> np.ndarray:
+        """
+        Apply update() to each row of a (T, num_classes) sequence at once.
+        
+        The recurrence is the IIR filter y[t] = alpha*x[t] + (1-alpha)*y[t-1],
+        run in C by scipy.signal.lfilter. The filter state is seeded from the
+        current EMA (or the first row when uninitialized), so batches and
+        single updates can be mixed freely.
+        
+        The filter runs in float64; only the final row is stored back into
+        the float32 state.
+        
+        Returns:
+            Smoothed sequence with the same shape as probs_seq
+        """
+        try:
+            from scipy.signal import lfilter
+        except ImportError as e:
+            raise RuntimeError("SciPy is required for EMA.update_batch (pip install scipy)") from e
+        
+        seq = np.asarray(probs_seq, dtype=float)
+        if len(seq) == 0:
+            return seq.copy()
+        
+        prev = self.ema if self.initialized else seq[0]
+        zi = ((1 - self.alpha) * prev)[np.newaxis, :]
+        smoothed, _ = lfilter([self.alpha], [1.0, -(1.0 - self.alpha)], seq, axis=0, zi=zi)
+        
+        self.ema[...] = smoothed[-1]
+        self.initialized = True
+        return smoothed
+
+class EMAQuant:
+    """
+    EMA with the state stored as Q0.16 fixed point (uint16).
+    
+    Probabilities only need display/voting precision, so 16 bits per class
+    is enough and the state is half the size of the float32 EMA. Weights are
+    scaled by 2**16 so the update is a multiply-add and a rounding shift.
+    """
+    ONE = 65535
+
+    def __init__(self, alpha: float = 0.5, num_classes: int = 14):
+        self.alpha = alpha
+        self.alpha_q = int(round(alpha * 65536))
+        self.beta_q = 65536 - self.alpha_q
+        self.ema = np.zeros(num_classes, dtype=np.uint16)
+        self.initialized = False
+
+    def update(self, probs) -> np.ndarray:
+        p_q = np.rint(np.asarray(probs, dtype=float) * self.ONE).astype(np.uint32)
         if not self.initialized:
-            self.ema = probs_arr
+            self.ema[...] = p_q
             self.initialized = True
         else:
-            self.ema = self.alpha * probs_arr + (1 - self.alpha) * self.ema
-        return self.ema.tolist()
+            acc = self.ema.astype(np.uint32) * self.beta_q + p_q * self.alpha_q
+            self.ema[...] = (acc + (1 << 15)) >> 16
+        return self.ema
+
+    def as_float(self) -> np.ndarray:
+        """State converted back to probabilities in [0, 1]"""
+        return self.ema / self.ONE
 
 class MajorityVote:
     """Majority voting for smoothing predictions over time"""
-    def __init__(self, window_size: int = 5):
+    def __init__(self, window_size: int = 5, num_classes: int = 14):
         self.window_size = window_size
-        self.queue = deque(maxlen=window_size)
+        # Circular window of labels; head is the slot the next label overwrites
+        self.buf = np.full(window_size, -1, dtype=np.int32)
+        self.head = 0
+        self.filled = 0
+        self.counts = np.zeros(num_classes, dtype=np.int32)
+
+    @property
+    def queue(self) -> List[int]:
+        """Labels currently in the window, oldest first"""
+        if self.filled < self.window_size:
+            return self.buf[:self.filled].tolist()
+        return np.roll(self.buf, -self.head).tolist()
 
     def update(self, label: int) -> int:
-        self.queue.append(label)
-        return max(set(self.queue), key=self.queue.count)
+        # Keep a running label histogram so each update avoids rescanning the window;
+        # ties go to the lowest label
+        if not 0 <= label < len(self.counts):
+            # negative labels would silently index counts from the end
+            raise ValueError(f"label must be in [0, {len(self.counts)}), got {label}")
+        if self.filled == self.window_size:
+            self.counts[self.buf[self.head]] -= 1
+        else:
+            self.filled += 1
+        self.buf[self.head] = label
+        self.head = (self.head + 1) % self.window_size
+        self.counts[label] += 1
+        return int(self.counts.argmax())
+
+    def score_sequence(self, labels) -> np.ndarray:
+        """
+        Majority label of every full window in a label sequence at once.
+        
+        Equivalent to the values update() returns once the window is full,
+        computed with one vectorized histogram over all windows instead of a
+        Python loop. The vote's own state is left untouched.
+        
+        Returns:
+            int array of length len(labels) - window_size + 1 (empty if shorter)
+        
+        Raises:
+            ValueError: If any label is outside [0, num_classes), as in update()
+        """
+        labels = np.asarray(labels, dtype=np.int32)
+        if len(labels) and (labels.min() < 0 or labels.max() >= len(self.counts)):
+            # the one-hot histogram would silently drop these, where update() raises
+            bad = labels[(labels < 0) | (labels >= len(self.counts))][0]
+            raise ValueError(f"label must be in [0, {len(self.counts)}), got {bad}")
+        if len(labels) < self.window_size:
+            return np.empty(0, dtype=np.int64)
+        windows = np.lib.stride_tricks.sliding_window_view(labels, self.window_size)
+        counts = (windows[..., np.newaxis] == np.arange(len(self.counts))).sum(axis=1)
+        return counts.argmax(axis=1)
@@ -1,48 +1,435 @@
 import cv2
+import numpy as np
+from contextlib import contextmanager
+from fractions import Fraction
 from typing import Iterator, Optional
 import os
+import queue
+import threading
 
-def iter_frames(source: str, fps_out: int = 2) -> Iterator:
+def _open_capture(source: str) -> cv2.VideoCapture:
+    """
+    Open a video source, preferring hardware-accelerated decoding.
+    
+    VIDEO_ACCELERATION_ANY lets the backend pick NVDEC/VAAPI/D3D11/VideoToolbox
+    when available and decode in software otherwise. If the backend refuses the
+    open parameters altogether, fall back to a plain capture.
+    """
+    cap = cv2.VideoCapture(source, cv2.CAP_ANY, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+    if not cap.isOpened():
+        cap.release()
+        cap = cv2.VideoCapture(source)
+    return cap
+
+@contextmanager
+def _video(source: str) -> Iterator[cv2.VideoCapture]:
+    """
+    Open source for sequential sampling and release it on exit.
+    
+    The backend's internal frame queue is cut to one frame: samplers consume
+    frames as fast as they are decoded, so deeper read-ahead only costs
+    memory and latency.
+    """
+    cap = _open_capture(source)
+    try:
+        if not cap.isOpened():
+            raise _open_error(source)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        yield cap
+    finally:
+        cap.release()
+
+# Frame intervals at or above this seek with CAP_PROP_POS_FRAMES instead of
+# grabbing every skipped frame (roughly one GOP for typical 30 fps encodes)
+SEEK_MIN_INTERVAL = 30
+
+# iter_frames color modes and the PyAV pixel format each one decodes to
+PYAV_FORMATS = {"bgr": "bgr24", "gray": "gray", "yuv420": "yuv420p"}
+
+# Hardware decoders tried by the PyAV backend, in order of preference
+PYAV_HWACCEL_DEVICES = ("cuda", "vaapi", "d3d11va", "videotoolbox", "qsv")
+
+_PYAV_UPGRADE_HINT = "backend='pyav' requires PyAV >= 14, found {} (pip install -U av)"
+
+def _open_pyav(source: str):
+    """
+    Open a container with PyAV, preferring a hardware decoder.
+    
+    Falls back to software decoding when no hardware device is usable.
+    Requires PyAV >= 14, the first release with hardware decoding.
+    """
+    import av
+    try:
+        from av.codec.hwaccel import HWAccel, hwdevices_available
+    except ImportError as e:
+        raise RuntimeError(_PYAV_UPGRADE_HINT.format(av.__version__)) from e
+    
+    available = hwdevices_available()
+    for device_type in PYAV_HWACCEL_DEVICES:
+        if device_type not in available:
+            continue
+        try:
+            return av.open(source, hwaccel=HWAccel(device_type=device_type, allow_software_fallback=True))
+        except av.error.FFmpegError:
+            continue
+        except TypeError as e:
+            # av.open() without the hwaccel keyword
+            raise RuntimeError(_PYAV_UPGRADE_HINT.format(av.__version__)) from e
+    return av.open(source)
+
+def _iter_frames_pyav(
+    source: str, fps_out: float, keyframe_only: bool = False, pix_fmt: str = "bgr24"
+) -> Iterator:
+    """
+    PyAV implementation of iter_frames.
+    
+    Frames are kept when their presentation time reaches the next 1/fps_out
+    tick, and only kept frames are converted to BGR. When fps_out < 1 the
+    container seeks to the keyframe before each tick instead of decoding the
+    whole gap in between. With keyframe_only the decoder skips non-keyframes
+    entirely and each tick snaps to the first keyframe at or after it.
+    Kept frames are converted to pix_fmt (a PyAV to_ndarray format).
+    """
+    try:
+        import av
+    except ImportError as e:
+        raise RuntimeError("PyAV is required for backend='pyav' (pip install av)") from e
+    
+    try:
+        container = _open_pyav(source)
+    except av.error.FFmpegError as e:
+        raise _open_error(source) from e
+    
+    with container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if keyframe_only:
+            stream.codec_context.skip_frame = "NONKEY"
+        rate = float(stream.average_rate or 30)
+        period = 1.0 / fps_out
+        next_t = 0.0
+        
+        if fps_out < 1:
+            while True:
+                container.seek(int(next_t / stream.time_base), stream=stream, any_frame=False, backward=True)
+                frame = None
+                for candidate in container.decode(stream):
+                    t = candidate.time if candidate.time is not None else next_t
+                    # keyframes too: the seek lands on the keyframe before the tick,
+                    # which with a GOP longer than the period is the one already yielded
+                    if t >= next_t - 0.5 / rate:
+                        frame = candidate
+                        break
+                if frame is None:
+                    break
+                yield frame.to_ndarray(format=pix_fmt)
+                next_t = _next_tick(next_t, period, frame.time)
+        else:
+            for i, frame in enumerate(container.decode(stream)):
+                t = frame.time if frame.time is not None else i / rate
+                # Half a source frame of slack keeps rounding in pts from skipping a tick
+                if t >= next_t - 0.5 / rate:
+                    yield frame.to_ndarray(format=pix_fmt)
+                    next_t = _next_tick(next_t, period, t)
+
+def _next_tick(next_t: float, period: float, t: Optional[float]) -> float:
+    """Advance the sampling tick past time t (a snapped keyframe may skip ticks)"""
+    next_t += period
+    while t is not None and next_t <= t:
+        next_t += period
+    return next_t
+
+def iter_frames(
+    source: str,
+    fps_out: int = 2,
+    backend: str = "opencv",
+    keyframe_only: bool = False,
+    size: Optional[int] = None,
+    reuse_buffer: bool = True,
+    color: str = "bgr",
+) -> Iterator:
     """
     Iterate through video frames at specified output FPS.
     
     Args:
-        source: Path to video file
+        source: Path or URL of the video
         fps_out: Output frames per second (default: 2)
+        backend: "opencv" (default) or "pyav" for PyAV decoding with
+            hardware acceleration and keyframe seeking when fps_out < 1
+        keyframe_only: Decode keyframes only and snap each sample to the next
+            keyframe; approximate but much cheaper (requires backend="pyav")
+        size: If given, resize each frame to (size, size) before yielding it
+            (default: None, keep source resolution)
+        reuse_buffer: With size set, resize every frame into one preallocated
+            array that is yielded each time, so a frame is only valid until
+            the next one is requested. Copy it to keep it (default: True)
+        color: "bgr" (default), "gray" for single-channel (H, W) frames, or
+            "yuv420" for planar (H * 3/2, W) I420 frames as the decoder emits
+            them, without any color conversion (requires backend="pyav")
     
     Yields:
-        Frame as numpy array (BGR format from OpenCV)
+        Frame as numpy array (BGR format from OpenCV unless color is set)
     
     Raises:
+        ValueError: If size or color is invalid
         RuntimeError: If video cannot be opened or if fps_out is invalid
     """
-    if not os.path.exists(source):
-        raise RuntimeError(f"Video file not found: {source}")
+    if size is not None and size <= 0:
+        raise ValueError("size must be greater than 0")
+    if color not in PYAV_FORMATS:
+        raise ValueError(f"Unsupported color: {color}. Must be 'bgr', 'gray' or 'yuv420'")
+    if color == "yuv420" and size is not None:
+        raise ValueError("size cannot be used with color='yuv420'")
     
-    if fps_out <= 0:
-        raise ValueError("fps_out must be greater than 0")
+    _check_fps(fps_out)
     
-    cap = cv2.VideoCapture(source)
-    if not cap.isOpened():
-        raise RuntimeError(f"Failed to open video source: {source}")
+    if backend == "pyav":
+        frames = _iter_frames_pyav(source, fps_out, keyframe_only, PYAV_FORMATS[color])
+    elif backend != "opencv":
+        raise ValueError(f"Unsupported backend: {backend}. Must be 'opencv' or 'pyav'")
+    elif keyframe_only:
+        raise ValueError("keyframe_only requires backend='pyav'")
+    elif color == "yuv420":
+        raise ValueError("color='yuv420' requires backend='pyav'")
+    else:
+        # Resized frames are copied out right away, so decoding can reuse one scratch frame
+        frames = _iter_frames_opencv(source, fps_out, reuse_decoded=size is not None, gray=color == "gray")
     
-    try:
-        orig_fps = cap.get(cv2.CAP_PROP_FPS) or 30
-        if orig_fps <= 0:
-            orig_fps = 30  # Default fallback
-        
-        frame_interval = int(round(orig_fps / fps_out))
-        count = 0
-        frame_yielded = 0
-        
-        while True:
-            ret, frame = cap.read()
+    if size is None:
+        yield from frames
+        return
+    
+    buf = None
+    for frame in frames:
+        if buf is None or not reuse_buffer:
+            buf = np.empty((size, size) + frame.shape[2:], dtype=np.uint8)
+        _resize_into(frame, buf)
+        yield buf
+
+def _iter_frames_opencv(
+    source: str, fps_out: int, reuse_decoded: bool, gray: bool = False
+) -> Iterator[np.ndarray]:
+    """Sample frames with OpenCV, optionally decoding into one reused array"""
+    frame = None
+    out = None
+    with _video(source) as cap:
+        for _ in _grab_sampled(cap, fps_out):
+            ret, frame = cap.retrieve(frame if reuse_decoded else None)
             if not ret:
                 break
-            if count % frame_interval == 0:
+            if gray:
+                # OpenCV's decoders always emit BGR, so convert after decoding
+                out = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=out if reuse_decoded else None)
+                yield out
+            else:
                 yield frame
-                frame_yielded += 1
-            count += 1
+
+
+def iter_frames_prefetched(
+    source: str, fps_out: int = 2, prefetch: int = 8, backend: str = "opencv"
+) -> Iterator:
+    """
+    iter_frames with decoding moved to a background thread.
+    
+    A single producer thread decodes up to prefetch frames ahead into a
+    bounded queue, so decoding overlaps with whatever the caller does per
+    frame (typically GPU inference). Frames arrive in source order because
+    only that one thread writes to the queue. Both backends release the GIL
+    while decoding.
+    
+    Args:
+        source: Path or URL of the video
+        fps_out: Output frames per second (default: 2)
+        prefetch: Maximum number of decoded frames buffered ahead (default: 8)
+        backend: Decoding backend, as for iter_frames
+    
+    Yields:
+        Frame as numpy array (BGR format from OpenCV)
+    
+    Raises:
+        ValueError: If prefetch is invalid
+        RuntimeError: If video cannot be opened or if fps_out is invalid
+    """
+    if prefetch <= 0:
+        raise ValueError("prefetch must be greater than 0")
+    
+    frames = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    
+    def produce():
+        decoded = iter_frames(source, fps_out, backend)
+        try:
+            for frame in decoded:
+                if not _put_unless_stopped(frames, frame, stop):
+                    return
+        except Exception as e:
+            _put_unless_stopped(frames, e, stop)
+            return
+        finally:
+            decoded.close()
+        _put_unless_stopped(frames, _END_OF_FRAMES, stop)
+    
+    producer = threading.Thread(target=produce, name="frame-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is _END_OF_FRAMES:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
     finally:
-        cap.release()
+        stop.set()
+        producer.join()
+
+
+# Queued by the prefetch producer after the last frame
+_END_OF_FRAMES = object()
+
+def _put_unless_stopped(frames: queue.Queue, item, stop: threading.Event) -> bool:
+    """Block until item is queued or the consumer has gone away"""
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _check_fps(fps_out: float) -> None:
+    """Validate the output frame rate before opening the source"""
+    if fps_out <= 0:
+        raise ValueError("fps_out must be greater than 0")
+
+
+def _open_error(source: str) -> RuntimeError:
+    """
+    Describe why source could not be opened.
+    
+    Existence is only checked after a failed open, so successful opens skip
+    the stat() and URLs (rtsp://, http://) are handed straight to the decoder.
+    """
+    if "://" not in source and not os.path.exists(source):
+        return RuntimeError(f"Video file not found: {source}")
+    return RuntimeError(f"Failed to open video source: {source}")
+
+
+def _grab_sampled(cap: cv2.VideoCapture, fps_out: float) -> Iterator[None]:
+    """
+    Advance cap with grab() and pause on every frame that should be kept.
+    
+    grab() demuxes without the color conversion and ndarray allocation of
+    read(), so only the caller's retrieve() of a kept frame pays for them.
+    Intervals of SEEK_MIN_INTERVAL frames or more seek instead of grabbing.
+    
+    Kept frames are at floor(k * orig_fps / fps_out), tracked with an exact
+    integer accumulator so non-integer ratios (29.97 fps, fps_out=0.5) do not
+    drift over long videos.
+    """
+    orig_fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    if orig_fps <= 0:
+        orig_fps = 30  # Default fallback
+    
+    # NTSC-style rates are n/1001, so that denominator recovers them exactly
+    ratio = Fraction(orig_fps).limit_denominator(1001) / Fraction(fps_out).limit_denominator(1001)
+    step, remainder = divmod(ratio.numerator, ratio.denominator)
+    if step == 0:
+        step, remainder = 1, 0  # fps_out above the source rate keeps every frame
+    seek = step >= SEEK_MIN_INTERVAL
+    position = 0  # index of the frame the next grab() returns
+    target = 0  # index of the next frame to keep
+    acc = 0  # fractional part of the exact target, in units of 1/denominator
+    
+    while True:
+        if seek and position < target:
+            # Jump over whole GOPs; sources that cannot seek fall back to grabbing
+            seek = cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            if seek:
+                position = target
+        while position < target:
+            if not cap.grab():
+                return
+            position += 1
+        if not cap.grab():
+            return
+        position += 1
+        yield
+        target += step
+        acc += remainder
+        if acc >= ratio.denominator:
+            acc -= ratio.denominator
+            target += 1
+
+def iter_frame_batches(
+    source: str, fps_out: int = 2, batch_size: int = 32, size: Optional[int] = None
+) -> Iterator[np.ndarray]:
+    """
+    Iterate through video frames at specified output FPS, grouped into batches.
+    
+    Frames are copied into one preallocated uint8 buffer of shape
+    (batch_size, H, W, 3) that is reused for every batch, so a yielded batch
+    is only valid until the next one is requested. Copy it to keep it.
+    
+    Args:
+        source: Path or URL of the video
+        fps_out: Output frames per second (default: 2)
+        batch_size: Maximum number of frames per batch (default: 32)
+        size: If given, resize each frame to (size, size) on the way into the
+            buffer, so batches are ready for predict_batch_tensor without a
+            full-resolution upload (default: None, keep source resolution)
+    
+    Yields:
+        Batch as numpy array of shape (N, H, W, 3) in BGR format, N <= batch_size
+    
+    Raises:
+        ValueError: If batch_size or size is invalid
+        RuntimeError: If video cannot be opened
+    """
+    if batch_size <= 0:
+        raise ValueError("batch_size must be greater than 0")
+    if size is not None and size <= 0:
+        raise ValueError("size must be greater than 0")
+    
+    _check_fps(fps_out)
+    
+    buf = None
+    frame = None
+    n = 0
+    with _video(source) as cap:
+        for _ in _grab_sampled(cap, fps_out):
+            if size is not None:
+                # Decode into one reused scratch frame and resize into the batch slot
+                ret, frame = cap.retrieve(frame)
+                if not ret:
+                    break
+                if buf is None:
+                    buf = np.empty((batch_size, size, size, 3), dtype=np.uint8)
+                _resize_into(frame, buf[n])
+            elif buf is None:
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                buf = np.empty((batch_size, *frame.shape), dtype=np.uint8)
+                buf[0] = frame
+            else:
+                # Decode straight into the batch slot instead of a fresh array
+                ret, _ = cap.retrieve(buf[n])
+                if not ret:
+                    break
+            n += 1
+            if n == batch_size:
+                yield buf
+                n = 0
+    
+    if n:
+        yield buf[:n]
+
 
+def _resize_into(frame: np.ndarray, dst: np.ndarray) -> None:
+    """Resize frame into dst, area-averaging when shrinking"""
+    h, w = dst.shape[:2]
+    shrinking = frame.shape[0] > h or frame.shape[1] > w
+    interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR
+    cv2.resize(frame, (w, h), dst=dst, interpolation=interpolation)
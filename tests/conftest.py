@@ -14,6 +14,19 @@ PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.insert(0, str(PROJECT_ROOT))
 
 
+_rng = None
+
+
+def rand_frame(*shape):
+    """Random uint8 array of the given shape, from a fixed-seed generator"""
+    import numpy as np
+    global _rng
+    if _rng is None:
+        _rng = np.random.default_rng(0)
+    # The full 0-255 range needs no rejection sampling, unlike randint(0, 255)
+    return _rng.integers(0, 256, size=shape, dtype=np.uint8)
+
+
 @pytest.fixture
 def temp_db():
     """Create a temporary database for testing"""
@@ -26,37 +39,126 @@ def temp_db():
     shutil.rmtree(temp_dir)
 
 
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "fast_hash: hash passwords with a single PBKDF2 iteration"
+    )
+
+
+@pytest.fixture(autouse=True)
+def fast_hash(request, monkeypatch):
+    """
+    Cut PBKDF2 to one iteration for tests marked fast_hash.
+    
+    The hash format, salting and verification path are unchanged, so only
+    tests that assert on the KDF cost itself need the real iteration count.
+    """
+    if request.node.get_closest_marker("fast_hash") is None:
+        return
+    import auth.db as db_module
+    monkeypatch.setattr(db_module, "PBKDF2_ITERATIONS", 1)
+
+
+@pytest.fixture(scope="session")
+def auth_engine():
+    """One in-memory SQLite database shared by every auth test in the session"""
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.pool import StaticPool
+    from auth.db import Base
+    
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    
+    # Let SQLAlchemy emit BEGIN itself so per-test SAVEPOINTs work on pysqlite
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+    
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def auth_db(auth_engine):
+    """
+    Point auth.db.SessionLocal at the shared in-memory database for one test.
+    
+    Sessions join an outer transaction through SAVEPOINTs, so everything a
+    test commits is rolled back afterwards.
+    """
+    import auth.db as db_module
+    
+    connection = auth_engine.connect()
+    transaction = connection.begin()
+    saved_config = dict(db_module.SessionLocal.kw)
+    db_module.SessionLocal.configure(bind=connection, join_transaction_mode="create_savepoint")
+    yield
+    db_module.SessionLocal.kw = saved_config
+    transaction.rollback()
+    connection.close()
+    db_module._auth_cache.clear()
+
+
+@pytest.fixture
+def db(auth_db):
+    """A SessionLocal session on the test database, closed after the test"""
+    from auth.db import SessionLocal
+    
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def user_factory(db):
+    """
+    Return make_user(username, password, role="user") creating users in db.
+    
+    No per-user cleanup is needed: auth_db rolls back the whole test.
+    """
+    from auth.db import create_user
+    
+    def make_user(username, password, role="user"):
+        return create_user(db, username, password, role=role)
+    
+    return make_user
+
+
 @pytest.fixture
 def sample_frame():
     """Create a sample video frame (numpy array)"""
-    import numpy as np
     # Create a random BGR frame (480x640x3)
-    frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
-    return frame
+    return rand_frame(480, 640, 3)
 
 
 @pytest.fixture
 def sample_frames(sample_frame):
     """Create multiple sample frames"""
-    import numpy as np
-    frames = [np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(5)]
-    return frames
+    return [rand_frame(480, 640, 3) for _ in range(5)]
 
 
-@pytest.fixture
-def sample_video_path(tmp_path):
-    """Create a temporary video file for testing"""
+@pytest.fixture(scope="session")
+def sample_video_path(tmp_path_factory):
+    """Create a small video file once per session (tests only read it)"""
     import cv2
     import numpy as np
     
-    video_path = tmp_path / "test_video.mp4"
-    # Use MJPEG codec which is more compatible
-    fourcc = int(cv2.VideoWriter.fourcc('m', 'p', '4', 'v'))
-    out = cv2.VideoWriter(str(video_path), fourcc, 30.0, (640, 480))
+    video_path = tmp_path_factory.mktemp("video") / "test_video.avi"
+    # MJPEG encodes each frame independently and skips mp4v's rate control
+    fourcc = cv2.VideoWriter.fourcc(*'MJPG')
+    out = cv2.VideoWriter(str(video_path), fourcc, 30.0, (160, 120))
     
-    # Write 30 frames
+    # Write 30 frames; XOR-ing one noise frame keeps them distinct without fresh RNG draws
+    base = rand_frame(120, 160, 3)
+    frame = np.empty_like(base)
     for i in range(30):
-        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        np.bitwise_xor(base, np.uint8(i), out=frame)
         out.write(frame)
     
     out.release()
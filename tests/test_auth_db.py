@@ -8,10 +8,14 @@ from auth.db import (
     get_user_by_id, list_all_users, delete_user, update_user_password,
     User, SessionLocal, Base, engine
 )
+from unittest.mock import patch
+from sqlalchemy import create_engine
 import os
 import tempfile
 import sqlite3
 
+pytestmark = pytest.mark.usefixtures("auth_db")
+
 
 class TestUserModel:
     """Test User ORM model"""
@@ -36,9 +40,10 @@ class TestDatabaseInit:
     def test_init_db_creates_tables(self, tmp_path):
         """Test that init_db creates necessary tables"""
         db_file = tmp_path / "test.db"
-        os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
+        test_engine = create_engine(f"sqlite:///{db_file}")
         
-        init_db()
+        init_db(bind=test_engine)
+        test_engine.dispose()
         
         # Verify tables were created
         assert db_file.exists()
@@ -49,269 +54,256 @@ class TestDatabaseInit:
         conn.close()
         
         assert result is not None
+    
+    def test_init_db_enables_wal(self, tmp_path):
+        """Test that init_db switches the database file to WAL journaling"""
+        db_file = tmp_path / "test.db"
+        test_engine = create_engine(f"sqlite:///{db_file}")
+        
+        init_db(bind=test_engine)
+        test_engine.dispose()
+        
+        conn = sqlite3.connect(str(db_file))
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        conn.close()
+        
+        assert journal_mode == "wal"
 
 
+@pytest.mark.fast_hash
 class TestCreateUser:
     """Test user creation functionality"""
     
-    def test_create_user_success(self):
+    def test_create_user_success(self, user_factory):
         """Test successful user creation"""
-        db = SessionLocal()
-        try:
-            user = create_user(db, "newuser", "password123", role="user")
-            assert user.username == "newuser"
-            assert user.role == "user"
-            assert user.hashed_password != "password123"  # Password should be hashed
-        finally:
-            delete_user(db, "newuser")
-            db.close()
+        user = user_factory("newuser", "password123", role="user")
+        assert user.username == "newuser"
+        assert user.role == "user"
+        assert user.hashed_password != "password123"  # Password should be hashed
     
-    def test_create_admin_user(self):
+    def test_create_admin_user(self, user_factory):
         """Test admin user creation"""
-        db = SessionLocal()
-        try:
-            user = create_user(db, "adminuser", "adminpass", role="admin")
-            assert user.role == "admin"
-        finally:
-            delete_user(db, "adminuser")
-            db.close()
+        user = user_factory("adminuser", "adminpass", role="admin")
+        assert user.role == "admin"
     
-    def test_create_user_duplicate_username(self):
+    def test_create_user_duplicate_username(self, user_factory):
         """Test that duplicate usernames raise error"""
-        db = SessionLocal()
-        try:
-            create_user(db, "dupuser", "password1", role="user")
-            with pytest.raises(ValueError, match="already exists"):
-                create_user(db, "dupuser", "password2", role="user")
-        finally:
-            delete_user(db, "dupuser")
-            db.close()
+        user_factory("dupuser", "password1", role="user")
+        with pytest.raises(ValueError, match="already exists"):
+            user_factory("dupuser", "password2", role="user")
+    
+    def test_create_user_duplicate_keeps_session_usable(self, user_factory):
+        """Test that the session still works after a rejected duplicate"""
+        user_factory("dupuser2", "password1", role="user")
+        with pytest.raises(ValueError, match="already exists"):
+            user_factory("dupuser2", "password2", role="user")
+        user = user_factory("dupuser3", "password3", role="user")
+        assert user.id is not None
     
-    def test_create_user_invalid_role(self):
+    def test_create_user_invalid_role(self, user_factory):
         """Test that invalid roles raise error"""
-        db = SessionLocal()
         with pytest.raises(ValueError, match="Invalid role"):
-            create_user(db, "testuser", "password", role="superuser")
-        db.close()
+            user_factory("testuser", "password", role="superuser")
     
-    def test_create_user_default_role(self):
+    def test_create_user_default_role(self, db):
         """Test that default role is 'user'"""
-        db = SessionLocal()
-        try:
-            user = create_user(db, "defaultrole", "password")
-            assert user.role == "user"
-        finally:
-            delete_user(db, "defaultrole")
-            db.close()
+        user = create_user(db, "defaultrole", "password")
+        assert user.role == "user"
 
 
+@pytest.mark.fast_hash
 class TestAuthenticateUser:
     """Test user authentication"""
     
-    def test_authenticate_user_valid_credentials(self):
+    def test_authenticate_user_valid_credentials(self, db, user_factory):
         """Test authentication with valid credentials"""
-        db = SessionLocal()
-        try:
-            create_user(db, "authuser", "correctpass", role="user")
-            user = authenticate_user(db, "authuser", "correctpass")
-            assert user is not None
-            assert user.username == "authuser"
-        finally:
-            delete_user(db, "authuser")
-            db.close()
+        user_factory("authuser", "correctpass", role="user")
+        user = authenticate_user(db, "authuser", "correctpass")
+        assert user is not None
+        assert user.username == "authuser"
     
-    def test_authenticate_user_invalid_password(self):
+    def test_authenticate_user_invalid_password(self, db, user_factory):
         """Test authentication with wrong password"""
-        db = SessionLocal()
-        try:
-            create_user(db, "authuser", "correctpass", role="user")
-            user = authenticate_user(db, "authuser", "wrongpass")
-            assert user is None
-        finally:
-            delete_user(db, "authuser")
-            db.close()
+        user_factory("authuser", "correctpass", role="user")
+        user = authenticate_user(db, "authuser", "wrongpass")
+        assert user is None
     
-    def test_authenticate_user_nonexistent(self):
+    def test_authenticate_user_nonexistent(self, db):
         """Test authentication with non-existent user"""
-        db = SessionLocal()
         user = authenticate_user(db, "nonexistent", "anypass")
         assert user is None
-        db.close()
     
-    def test_authenticate_admin_user(self):
+    def test_authenticate_user_nonexistent_still_verifies(self, db):
+        """Test unknown usernames still pay for a password verification"""
+        with patch("auth.db._verify_password", return_value=True) as mock_verify:
+            user = authenticate_user(db, "nonexistent", "anypass")
+        assert user is None
+        mock_verify.assert_called_once()
+    
+    def test_authenticate_admin_user(self, db, user_factory):
         """Test authentication for admin user"""
-        db = SessionLocal()
-        try:
-            create_user(db, "admin", "adminpass", role="admin")
-            user = authenticate_user(db, "admin", "adminpass")
-            assert user is not None
-            assert user.role == "admin"
-        finally:
-            delete_user(db, "admin")
-            db.close()
+        user_factory("admin", "adminpass", role="admin")
+        user = authenticate_user(db, "admin", "adminpass")
+        assert user is not None
+        assert user.role == "admin"
 
 
+@pytest.mark.fast_hash
 class TestGetUser:
     """Test user retrieval methods"""
     
-    def test_get_user_by_username(self):
+    def test_get_user_by_username(self, db, user_factory):
         """Test retrieving user by username"""
-        db = SessionLocal()
-        try:
-            created_user = create_user(db, "gettest", "password", role="user")
-            retrieved_user = get_user_by_username(db, "gettest")
-            assert retrieved_user is not None
-            assert retrieved_user.username == "gettest"
-        finally:
-            delete_user(db, "gettest")
-            db.close()
+        user_factory("gettest", "password", role="user")
+        retrieved_user = get_user_by_username(db, "gettest")
+        assert retrieved_user is not None
+        assert retrieved_user.username == "gettest"
     
-    def test_get_user_by_username_nonexistent(self):
+    def test_get_user_by_username_nonexistent(self, db):
         """Test retrieving non-existent user by username"""
-        db = SessionLocal()
         user = get_user_by_username(db, "nonexistent")
         assert user is None
-        db.close()
     
-    def test_get_user_by_id(self):
+    def test_get_user_by_id(self, db, user_factory):
         """Test retrieving user by ID"""
-        db = SessionLocal()
-        try:
-            created_user = create_user(db, "getbyid", "password", role="user")
-            retrieved_user = get_user_by_id(db, created_user.id)
-            assert retrieved_user is not None
-            assert retrieved_user.id == created_user.id
-        finally:
-            delete_user(db, "getbyid")
-            db.close()
+        created_user = user_factory("getbyid", "password", role="user")
+        retrieved_user = get_user_by_id(db, created_user.id)
+        assert retrieved_user is not None
+        assert retrieved_user.id == created_user.id
     
-    def test_get_user_by_id_nonexistent(self):
+    def test_get_user_by_id_nonexistent(self, db):
         """Test retrieving non-existent user by ID"""
-        db = SessionLocal()
         user = get_user_by_id(db, 9999)
         assert user is None
-        db.close()
 
 
+@pytest.mark.fast_hash
 class TestListUsers:
     """Test listing users"""
     
-    def test_list_all_users(self):
+    def test_list_all_users(self, db, user_factory):
         """Test retrieving all users"""
-        db = SessionLocal()
-        try:
-            initial_count = len(list_all_users(db))
-            create_user(db, "user1", "pass1")
-            create_user(db, "user2", "pass2")
-            
-            all_users = list_all_users(db)
-            assert len(all_users) >= initial_count + 2
-        finally:
-            delete_user(db, "user1")
-            delete_user(db, "user2")
-            db.close()
+        initial_count = len(list_all_users(db))
+        user_factory("user1", "pass1")
+        user_factory("user2", "pass2")
+        
+        all_users = list_all_users(db)
+        assert len(all_users) >= initial_count + 2
     
-    def test_list_users_empty_or_nonempty(self):
+    def test_list_users_empty_or_nonempty(self, db):
         """Test list_all_users returns a list"""
-        db = SessionLocal()
         users = list_all_users(db)
         assert isinstance(users, list)
-        db.close()
 
 
+@pytest.mark.fast_hash
 class TestDeleteUser:
     """Test user deletion"""
     
-    def test_delete_user_success(self):
+    def test_delete_user_success(self, db, user_factory):
         """Test successful user deletion"""
-        db = SessionLocal()
-        create_user(db, "todelete", "password", role="user")
+        user_factory("todelete", "password", role="user")
         result = delete_user(db, "todelete")
         assert result is True
         
         # Verify user is deleted
         user = get_user_by_username(db, "todelete")
         assert user is None
-        db.close()
     
-    def test_delete_user_nonexistent(self):
+    def test_delete_user_nonexistent(self, db):
         """Test deleting non-existent user"""
-        db = SessionLocal()
         result = delete_user(db, "nonexistent")
         assert result is False
-        db.close()
 
 
+@pytest.mark.fast_hash
 class TestUpdatePassword:
     """Test password update functionality"""
     
-    def test_update_user_password_success(self):
+    def test_update_user_password_success(self, db, user_factory):
         """Test successful password update"""
-        db = SessionLocal()
-        try:
-            create_user(db, "passtest", "oldpass", role="user")
-            
-            # Verify old password works
-            user = authenticate_user(db, "passtest", "oldpass")
-            assert user is not None
-            
-            # Update password
-            result = update_user_password(db, "passtest", "newpass")
-            assert result is True
-            
-            # Verify old password doesn't work
-            user = authenticate_user(db, "passtest", "oldpass")
-            assert user is None
-            
-            # Verify new password works
-            user = authenticate_user(db, "passtest", "newpass")
-            assert user is not None
-        finally:
-            delete_user(db, "passtest")
-            db.close()
+        user_factory("passtest", "oldpass", role="user")
+        
+        # Verify old password works
+        user = authenticate_user(db, "passtest", "oldpass")
+        assert user is not None
+        
+        # Update password
+        result = update_user_password(db, "passtest", "newpass")
+        assert result is True
+        
+        # Verify old password doesn't work
+        user = authenticate_user(db, "passtest", "oldpass")
+        assert user is None
+        
+        # Verify new password works
+        user = authenticate_user(db, "passtest", "newpass")
+        assert user is not None
     
-    def test_update_password_nonexistent_user(self):
+    def test_update_password_nonexistent_user(self, db):
         """Test updating password for non-existent user"""
-        db = SessionLocal()
         result = update_user_password(db, "nonexistent", "newpass")
         assert result is False
-        db.close()
 
 
 class TestPasswordHashing:
     """Test password hashing security"""
     
-    def test_passwords_are_hashed(self):
+    def test_passwords_are_hashed(self, user_factory):
         """Test that passwords are hashed, not stored plaintext"""
-        db = SessionLocal()
-        try:
-            password = "cleartextpassword"
-            user = create_user(db, "hashtest", password, role="user")
-            
-            # Password should not be stored plaintext
-            assert user.hashed_password != password
-            # Hashed password should be different each time (salt)
-            user2 = create_user(db, "hashtest2", password, role="user")
-            assert user.hashed_password != user2.hashed_password
-        finally:
-            delete_user(db, "hashtest")
-            delete_user(db, "hashtest2")
-            db.close()
+        password = "cleartextpassword"
+        user = user_factory("hashtest", password, role="user")
+        
+        # Password should not be stored plaintext
+        assert user.hashed_password != password
+        # Hashed password should be different each time (salt)
+        user2 = user_factory("hashtest2", password, role="user")
+        assert user.hashed_password != user2.hashed_password
     
-    def test_hash_consistency(self):
+    def test_hash_consistency(self, db, user_factory):
         """Test that same password correctly verifies"""
-        db = SessionLocal()
-        try:
-            password = "testpassword123"
-            create_user(db, "hashcon", password, role="user")
-            
-            # Same password should authenticate
-            user1 = authenticate_user(db, "hashcon", password)
-            assert user1 is not None
-            
-            # Slightly different password should not authenticate
-            user2 = authenticate_user(db, "hashcon", password + "x")
-            assert user2 is None
-        finally:
-            delete_user(db, "hashcon")
-            db.close()
+        password = "testpassword123"
+        user_factory("hashcon", password, role="user")
+        
+        # Same password should authenticate
+        user1 = authenticate_user(db, "hashcon", password)
+        assert user1 is not None
+        
+        # Slightly different password should not authenticate
+        user2 = authenticate_user(db, "hashcon", password + "x")
+        assert user2 is None
+
+
+@pytest.mark.fast_hash
+class TestAuthCache:
+    """Test caching of successful logins"""
+    
+    def test_repeated_login_skips_password_verification(self, db, user_factory):
+        """Test that a cached login does not re-run the password KDF"""
+        import auth.db as auth_db
+        
+        user_factory("cacheuser", "cachepass", role="user")
+        assert authenticate_user(db, "cacheuser", "cachepass") is not None
+        
+        with patch.object(auth_db, "_verify_password", wraps=auth_db._verify_password) as mock_verify:
+            user = authenticate_user(db, "cacheuser", "cachepass")
+            assert user is not None
+            assert user.username == "cacheuser"
+            mock_verify.assert_not_called()
+    
+    def test_password_update_invalidates_cache(self, db, user_factory):
+        """Test that a cached login is dropped after a password change"""
+        user_factory("cacheupd", "oldpass", role="user")
+        assert authenticate_user(db, "cacheupd", "oldpass") is not None
+        
+        update_user_password(db, "cacheupd", "newpass")
+        assert authenticate_user(db, "cacheupd", "oldpass") is None
+        assert authenticate_user(db, "cacheupd", "newpass") is not None
+    
+    def test_deleted_user_not_served_from_cache(self, db, user_factory):
+        """Test that a deleted user can no longer authenticate"""
+        user_factory("cachedel", "password", role="user")
+        assert authenticate_user(db, "cachedel", "password") is not None
+        
+        delete_user(db, "cachedel")
+        assert authenticate_user(db, "cachedel", "password") is None
@@ -7,38 +7,29 @@ import numpy as np
 import torch
 from unittest.mock import Mock, patch, MagicMock
 from PIL import Image
+from tests.conftest import rand_frame
 
 
 class TestBgrToPil:
     """Test BGR to PIL conversion"""
     
-    @patch('ml.inference.cv2')
-    def test_bgr_to_pil_conversion(self, mock_cv2):
+    def test_bgr_to_pil_conversion(self):
         """Test BGR frame conversion to PIL image"""
         from ml.inference import bgr_to_pil
         
-        # Create mock BGR frame
-        bgr_frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        bgr_frame = rand_frame(480, 640, 3)
         
-        # Mock cv2.cvtColor to return RGB
-        mock_cv2.cvtColor.return_value = bgr_frame
-        mock_cv2.COLOR_BGR2RGB = 4
-        
-        # Call function
         result = bgr_to_pil(bgr_frame)
         
-        # Should be PIL Image
+        # Should be an RGB PIL Image with the channels reversed
         assert isinstance(result, Image.Image)
-        # Should have called cvtColor
-        mock_cv2.cvtColor.assert_called_once()
+        assert result.size == (640, 480)
+        np.testing.assert_array_equal(np.asarray(result), bgr_frame[:, :, ::-1])
     
-    @patch('ml.inference.cv2')
-    def test_bgr_to_pil_with_none_frame(self, mock_cv2):
+    def test_bgr_to_pil_with_none_frame(self):
         """Test BGR to PIL with None frame"""
         from ml.inference import bgr_to_pil
         
-        mock_cv2.cvtColor.side_effect = Exception("Cannot process None")
-        
         with pytest.raises(ValueError):
             bgr_to_pil(None)
 
@@ -69,7 +60,7 @@ class TestPredictFrame:
         mock_model.config.id2label = {i: f"class_{i}" for i in range(14)}
         
         # Create frame
-        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        frame = rand_frame(480, 640, 3)
         
         # Make prediction
         result = predict_frame(frame, top_k=3)
@@ -100,7 +91,7 @@ class TestPredictFrame:
         mock_model.return_value = Mock(logits=mock_logits)
         mock_model.config.id2label = {i: f"class_{i}" for i in range(14)}
         
-        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        frame = rand_frame(480, 640, 3)
         
         result1 = predict_frame(frame, top_k=1)
         result2 = predict_frame(frame, top_k=5)
@@ -132,7 +123,7 @@ class TestPredictBatch:
         mock_model.config.id2label = {i: f"class_{i}" for i in range(14)}
         
         # Create batch of frames
-        frames = [np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(5)]
+        frames = [rand_frame(480, 640, 3) for _ in range(5)]
         
         # Make batch prediction
         results = predict_batch(frames, top_k=3)
@@ -164,12 +155,62 @@ class TestPredictBatch:
         mock_model.return_value = Mock(logits=mock_logits)
         mock_model.config.id2label = {i: f"class_{i}" for i in range(14)}
         
-        frames = [np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(3)]
+        frames = [rand_frame(480, 640, 3) for _ in range(3)]
         
         results = predict_batch(frames)
         assert len(results) == 3
 
 
+    @patch('ml.inference.model')
+    @patch('ml.inference.processor')
+    def test_predict_batch_topk_values(self, mock_processor, mock_model):
+        """Test each batch row maps to its own top-k labels and probabilities"""
+        from ml.inference import predict_batch
+        
+        logits = torch.randn(4, 14)
+        mock_processor.preprocess_bgr.return_value = torch.randn(4, 3, 224, 224)
+        mock_model.return_value = Mock(logits=logits)
+        mock_model.config.id2label = {i: f"class_{i}" for i in range(14)}
+        
+        frames = [rand_frame(480, 640, 3) for _ in range(4)]
+        results = predict_batch(frames, top_k=3)
+        
+        probs = torch.softmax(logits, dim=-1)
+        for row, result in zip(probs, results):
+            values, indices = torch.topk(row, k=3)
+            assert list(result.keys()) == [f"class_{i}" for i in indices.tolist()]
+            np.testing.assert_allclose(list(result.values()), values.tolist(), rtol=1e-6)
+
+
+class TestPredictBatchTensor:
+    """Test batch prediction from uint8 frame batches"""
+    
+    @patch('ml.inference.model')
+    @patch('ml.inference.processor')
+    def test_predict_batch_tensor_success(self, mock_processor, mock_model):
+        """Test prediction on a stacked BGR batch"""
+        from ml.inference import predict_batch_tensor
+        
+        mock_processor.preprocess_bgr_batch.return_value = torch.randn(4, 3, 224, 224)
+        mock_model.return_value = Mock(logits=torch.randn(4, 14))
+        mock_model.config.id2label = {i: f"class_{i}" for i in range(14)}
+        
+        batch = rand_frame(4, 480, 640, 3)
+        
+        results = predict_batch_tensor(batch, top_k=2)
+        assert len(results) == 4
+        assert all(len(r) == 2 for r in results)
+        mock_processor.preprocess_bgr_batch.assert_called_once()
+    
+    @patch('ml.inference.model')
+    @patch('ml.inference.processor')
+    def test_predict_batch_tensor_empty(self, mock_processor, mock_model):
+        """Test prediction on an empty batch"""
+        from ml.inference import predict_batch_tensor
+        
+        assert predict_batch_tensor(np.empty((0, 480, 640, 3), dtype=np.uint8)) == []
+
+
 class TestInferenceEdgeCases:
     """Test edge cases in inference"""
     
@@ -184,7 +225,7 @@ class TestInferenceEdgeCases:
         mock_model.return_value = Mock(logits=mock_logits)
         mock_model.config.id2label = None  # Missing id2label
         
-        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        frame = rand_frame(480, 640, 3)
         
         # Should fall back to string IDs
         result = predict_frame(frame, top_k=3)
@@ -203,7 +244,7 @@ class TestInferenceEdgeCases:
         mock_model.return_value = Mock(logits=mock_logits)
         mock_model.config.id2label = {i: f"class_{i}" for i in range(14)}
         
-        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+        frame = rand_frame(480, 640, 3)
         
         result = predict_frame(frame)
         # Should not raise error
@@ -5,7 +5,9 @@ Unit tests for ml/model_loader.py - Model loading system
 import pytest
 import torch
 import numpy as np
-from ml.model_loader import ModelLoader, MODEL_PATH, SimpleImageProcessor, SimpleViTModel
+from unittest.mock import patch
+from ml.model_loader import ModelLoader, get_loader, MODEL_PATH, SimpleImageProcessor, SimpleViTModel
+from tests.conftest import rand_frame
 
 
 class TestSimpleImageProcessor:
@@ -49,6 +51,78 @@ class TestSimpleImageProcessor:
         result = processor(images=pil_img, return_tensors="pt")
         assert result["pixel_values"].shape == (1, 3, 256, 256)
     
+    def test_processor_outputs_not_shared(self):
+        """Test results of earlier calls survive staging buffer reuse"""
+        from PIL import Image
+        
+        processor = SimpleImageProcessor()
+        red = processor(images=Image.new('RGB', (300, 300), color=(255, 0, 0)))["pixel_values"]
+        first = red.clone()
+        processor(images=Image.new('RGB', (300, 300), color=(0, 0, 255)))
+        
+        assert torch.equal(red, first)
+    
+    def test_processor_preprocess_bgr(self):
+        """Test fused BGR preprocessing matches resize + normalize reference"""
+        import cv2
+        
+        processor = SimpleImageProcessor()
+        frame = rand_frame(480, 640, 3)
+        
+        result = processor.preprocess_bgr([frame, frame])
+        assert result.shape == (2, 3, 224, 224)
+        
+        rgb = cv2.resize(frame, (224, 224))[..., ::-1].astype(np.float32) / 255.0
+        expected = (rgb - [0.485, 0.456, 0.406]) / [0.229, 0.224, 0.225]
+        np.testing.assert_allclose(result[0].numpy(), expected.transpose(2, 0, 1), atol=1e-4)
+    
+    def test_processor_bgr_batch(self):
+        """Test tensor preprocessing of a uint8 BGR batch"""
+        processor = SimpleImageProcessor()
+        batch = np.zeros((2, 120, 160, 3), dtype=np.uint8)
+        batch[..., 0] = 255  # pure blue in BGR
+        
+        result = processor.preprocess_bgr_batch(batch, torch.device("cpu"))
+        assert result.shape == (2, 3, 224, 224)
+        assert result.dtype == torch.float32
+        # Blue must land in the last RGB channel
+        assert result[:, 2].mean() > result[:, 0].mean()
+    
+    def test_processor_bgr_batch_matches_pil_path(self):
+        """Test tensor preprocessing agrees with the PIL transform path"""
+        from PIL import Image
+        
+        processor = SimpleImageProcessor()
+        rgb = np.full((224, 224, 3), (10, 120, 240), dtype=np.uint8)
+        
+        expected = processor(images=Image.fromarray(rgb))["pixel_values"]
+        result = processor.preprocess_bgr_batch(rgb[None, :, :, ::-1], torch.device("cpu"))
+        torch.testing.assert_close(result, expected, atol=1e-5, rtol=1e-5)
+    
+    def test_processor_list_matches_single_images(self):
+        """Test a downscaled image gets the same pixel values alone or in a list"""
+        from PIL import Image
+        
+        processor = SimpleImageProcessor()
+        images = [Image.fromarray(rand_frame(480, 640, 3)) for _ in range(2)]
+        
+        batch = processor(images=images)["pixel_values"]
+        for i, img in enumerate(images):
+            torch.testing.assert_close(batch[i:i + 1], processor(images=img)["pixel_values"])
+    
+    @pytest.mark.skipif(not torch.cuda.is_available(), reason="CUDA not available")
+    def test_processor_image_list_on_cuda(self):
+        """Test CUDA and CPU processors agree on non-square, downscaled inputs"""
+        from PIL import Image
+        
+        processor = SimpleImageProcessor(device=torch.device("cuda"))
+        images = [Image.fromarray(rand_frame(480, 640, 3)) for _ in range(3)]
+        
+        result = processor(images=images)["pixel_values"]
+        expected = SimpleImageProcessor()(images=images)["pixel_values"]
+        assert result.device.type == "cuda"
+        torch.testing.assert_close(result.cpu(), expected, atol=1e-5, rtol=1e-5)
+    
     def test_processor_with_none_input(self):
         """Test processor handles None input"""
         processor = SimpleImageProcessor()
@@ -94,10 +168,11 @@ class TestModelLoader:
     """Test model loader singleton"""
     
     def test_model_loader_singleton(self):
-        """Test that ModelLoader is a singleton"""
-        loader1 = ModelLoader()
-        loader2 = ModelLoader()
+        """Test that get_loader returns a shared ModelLoader"""
+        loader1 = get_loader()
+        loader2 = get_loader()
         assert loader1 is loader2
+        assert isinstance(loader1, ModelLoader)
     
     def test_model_loader_initialization(self):
         """Test model loader initializes with None values"""
@@ -159,6 +234,81 @@ class TestModelLoaderEdgeCases:
         with pytest.raises(RuntimeError):
             loader.load(model_path="nonexistent/path.pth")
     
+    def test_load_with_compile(self, tmp_path):
+        """Test loading with torch.compile keeps the model config reachable"""
+        model_file = tmp_path / "model.pth"
+        torch.save({}, model_file)
+        
+        loader = ModelLoader()
+        loader.model = None
+        try:
+            model = loader.load(model_path=str(model_file), device="cpu", compile_model=True)
+            assert model.config.num_labels == 14
+        finally:
+            loader.model = None
+            loader.processor = None
+    
+    def test_failed_compile_not_cached(self, tmp_path):
+        """Test a compile error raised during warmup leaves nothing loaded"""
+        model_file = tmp_path / "model.pth"
+        torch.save({}, model_file)
+        
+        loader = ModelLoader()
+        with patch.object(ModelLoader, '_warmup', side_effect=RuntimeError("inductor failed")):
+            with pytest.raises(RuntimeError, match="inductor failed"):
+                loader.load(model_path=str(model_file), device="cpu", compile_model=True)
+        
+        assert loader.model is None
+        assert loader.processor is None
+    
+    def test_load_with_invalid_quantization(self):
+        """Test loading rejects unknown quantization modes"""
+        loader = ModelLoader()
+        loader.model = None
+        
+        with pytest.raises(ValueError, match="Unsupported quantization"):
+            loader.load(model_path="dummy_path", quantize="int4")
+    
+    def test_quantized_load(self, tmp_path):
+        """Test int8 loading on CPU swaps Linear layers for qint8 ones"""
+        class LinearViTModel(SimpleViTModel):
+            def __init__(self):
+                super().__init__()
+                self.head = torch.nn.Linear(8, 14)
+        
+        model_file = tmp_path / "model.pth"
+        torch.save({}, model_file)
+        
+        loader = ModelLoader()
+        with patch('ml.model_loader.SimpleViTModel', LinearViTModel):
+            model = loader.load(model_path=str(model_file), device="cpu", quantize="int8")
+        
+        assert isinstance(model.head, torch.ao.nn.quantized.dynamic.Linear)
+        assert model.head.weight().dtype == torch.qint8
+    
+    def test_failed_quantization_not_cached(self, tmp_path):
+        """Test a quantization error leaves nothing loaded so load() can be retried"""
+        model_file = tmp_path / "model.pth"
+        torch.save({}, model_file)
+        
+        loader = ModelLoader()
+        with patch('ml.model_loader._quantize', side_effect=RuntimeError("torchao failed")):
+            with pytest.raises(RuntimeError, match="torchao failed"):
+                loader.load(model_path=str(model_file), device="cpu", quantize="int8")
+        
+        assert loader.model is None
+        assert loader.processor is None
+        
+        model = loader.load(model_path=str(model_file), device="cpu")
+        assert model is loader.model
+    
+    def test_load_fp8_requires_cuda(self):
+        """Test fp8 quantization is rejected on CPU"""
+        loader = ModelLoader()
+        
+        with pytest.raises(ValueError, match="fp8 quantization is only supported on CUDA"):
+            loader.load(model_path="dummy_path", device="cpu", quantize="fp8")
+    
     def test_load_idempotent(self):
         """Test that loading is idempotent (doesn't reload if already loaded)"""
         loader = ModelLoader()
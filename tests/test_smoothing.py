@@ -4,7 +4,7 @@ Unit tests for ml/smoothing.py - Prediction smoothing
 
 import pytest
 import numpy as np
-from ml.smoothing import EMA, MajorityVote
+from ml.smoothing import EMA, EMAQuant, MajorityVote
 
 
 class TestEMA:
@@ -14,7 +14,8 @@ class TestEMA:
         """Test EMA initializes correctly"""
         ema = EMA(alpha=0.5, num_classes=14)
         assert ema.alpha == 0.5
-        assert len(ema.ema) == 14
+        assert ema.ema.shape == (14,)
+        assert ema.ema.dtype == np.float32
         assert not ema.initialized
     
     def test_ema_first_update(self):
@@ -68,6 +69,80 @@ class TestEMA:
         result = ema.update([0.3, 0.3, 0.4])
         assert isinstance(result, list)
     
+    def test_ema_update_array(self):
+        """Test update_array returns the live state array"""
+        ema = EMA(alpha=0.5, num_classes=3)
+        ema.update([0.5, 0.3, 0.2])
+        
+        result = ema.update_array(np.array([0.2, 0.3, 0.5]))
+        assert isinstance(result, np.ndarray)
+        assert result is ema.ema
+        np.testing.assert_array_almost_equal(result, [0.35, 0.3, 0.35])
+    
+    def test_ema_update_array_zero_alloc(self):
+        """Test update_array does not allocate per call"""
+        import tracemalloc
+        
+        ema = EMA(alpha=0.3, num_classes=14)
+        probs = np.full(14, 1 / 14, dtype=np.float32)
+        ema.update_array(probs)
+        
+        tracemalloc.start()
+        try:
+            before, _ = tracemalloc.get_traced_memory()
+            for _ in range(1000):
+                ema.update_array(probs)
+            after, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        assert after - before < 2048
+    
+    def test_ema_update_and_argmax(self):
+        """Test fused update returns the argmax of the list API result"""
+        rng = np.random.default_rng(0)
+        fused = EMA(alpha=0.3, num_classes=14)
+        reference = EMA(alpha=0.3, num_classes=14)
+        
+        for probs in rng.dirichlet(np.ones(14), size=20):
+            label, state = fused.update_and_argmax(probs)
+            assert label == int(np.argmax(reference.update(probs.tolist())))
+            assert state is fused.ema
+    
+    def test_ema_adaptive_alpha_tracks_variance(self):
+        """Test adaptive alpha rises after a step and is kept on a constant signal"""
+        step = EMA(alpha=0.5, num_classes=3, adaptive=True, var_window=10)
+        for _ in range(5):
+            step.update([0.8, 0.1, 0.1])
+        for _ in range(5):
+            step.update([0.1, 0.1, 0.8])
+        assert step.alpha > 0.5
+        
+        steady = EMA(alpha=0.5, num_classes=3, adaptive=True, var_window=10)
+        for _ in range(10):
+            steady.update([0.8, 0.1, 0.1])
+        assert steady.alpha == 0.5
+    
+    def test_ema_adaptive_step_after_flat_segment(self):
+        """Test a step after a constant segment is still tracked promptly"""
+        ema = EMA(alpha=0.5, num_classes=3, adaptive=True, var_window=10)
+        for _ in range(20):
+            ema.update([0.8, 0.1, 0.1])
+        for _ in range(5):
+            result = ema.update_array([0.1, 0.1, 0.8])
+        
+        # alpha=0.5 puts the new class ahead within a few frames; a floored
+        # alpha of 0.01 would still be near the old scores
+        assert result.argmax() == 2
+        assert ema._recent.dtype == np.float32 and ema._smoothed.dtype == np.float32
+    
+    def test_ema_fixed_alpha_by_default(self):
+        """Test alpha is left alone unless adaptive"""
+        ema = EMA(alpha=0.5, num_classes=3)
+        for _ in range(100):
+            ema.update([0.8, 0.1, 0.1])
+        assert ema.alpha == 0.5
+    
     def test_ema_with_numpy_array_input(self):
         """Test EMA with numpy array input"""
         ema = EMA(alpha=0.5, num_classes=3)
@@ -85,6 +160,56 @@ class TestEMA:
         
         # Should be close to constant value after many updates
         np.testing.assert_array_almost_equal(result, [0.7, 0.3], decimal=1)
+    
+    def test_ema_does_not_alias_input(self):
+        """Test EMA state is not shared with the caller's array"""
+        ema = EMA(alpha=0.5, num_classes=3)
+        probs = np.array([0.3, 0.3, 0.4])
+        ema.update(probs)
+        ema.update([0.1, 0.1, 0.8])
+        
+        # Updating the state in place must not touch the first input
+        np.testing.assert_array_equal(probs, [0.3, 0.3, 0.4])
+
+    
+    def test_ema_update_batch_matches_update(self):
+        """Test batched smoothing agrees with the per-frame loop"""
+        pytest.importorskip("scipy")
+        rng = np.random.default_rng(0)
+        seq = rng.random((50, 14))
+        
+        looped = EMA(alpha=0.3, num_classes=14)
+        expected = np.array([looped.update(row) for row in seq])
+        
+        batched = EMA(alpha=0.3, num_classes=14)
+        result = np.concatenate([batched.update_batch(seq[:20]), batched.update_batch(seq[20:])])
+        
+        # float32 state rounds the seed of the second batch
+        assert np.max(np.abs(result - expected)) < 1e-6
+        np.testing.assert_allclose(batched.update(seq[0]), looped.update(seq[0]), atol=1e-6)
+
+
+class TestEMAQuant:
+    """Test fixed-point EMA smoothing"""
+    
+    def test_ema_quant_matches_float(self):
+        """Test Q0.16 state tracks the float EMA closely"""
+        rng = np.random.default_rng(0)
+        quant = EMAQuant(alpha=0.3, num_classes=14)
+        reference = EMA(alpha=0.3, num_classes=14)
+        
+        for probs in rng.dirichlet(np.ones(14), size=100):
+            quant.update(probs)
+            expected = reference.update_array(probs)
+        
+        assert quant.ema.dtype == np.uint16
+        assert np.abs(quant.as_float() - expected).max() < 2e-4
+    
+    def test_ema_quant_first_update(self):
+        """Test first update initializes with the given values"""
+        quant = EMAQuant(alpha=0.5, num_classes=3)
+        quant.update([1.0, 0.0, 0.5])
+        np.testing.assert_allclose(quant.as_float(), [1.0, 0.0, 0.5], atol=1e-4)
 
 
 class TestMajorityVote:
@@ -96,6 +221,27 @@ class TestMajorityVote:
         assert mv.window_size == 5
         assert len(mv.queue) == 0
     
+    def test_majority_vote_counts_histogram(self):
+        """Test the label histogram tracks the window"""
+        mv = MajorityVote(window_size=3, num_classes=4)
+        for label in [0, 3, 3, 1]:
+            mv.update(label)
+        
+        assert mv.counts.tolist() == [0, 1, 0, 2]
+    
+    def test_majority_vote_rejects_out_of_range_label(self):
+        """Test labels outside [0, num_classes) are rejected without touching the window"""
+        mv = MajorityVote(window_size=3, num_classes=4)
+        mv.update(1)
+        
+        with pytest.raises(ValueError, match="label must be in"):
+            mv.update(4)
+        with pytest.raises(ValueError, match="label must be in"):
+            mv.update(-1)
+        
+        assert mv.queue == [1]
+        assert mv.counts.tolist() == [0, 1, 0, 0]
+    
     def test_majority_vote_single_update(self):
         """Test MajorityVote with single update"""
         mv = MajorityVote(window_size=5)
@@ -182,6 +328,43 @@ class TestMajorityVote:
         assert isinstance(result_large, int)
 
 
+    def test_majority_vote_matches_window_count(self):
+        """Test running counts agree with recounting the window"""
+        rng = np.random.default_rng(0)
+        mv = MajorityVote(window_size=7)
+        
+        for label in rng.integers(0, 4, size=200).tolist():
+            result = mv.update(label)
+            window = list(mv.queue)
+            assert window.count(result) == max(window.count(l) for l in window)
+    
+    def test_majority_vote_score_sequence(self):
+        """Test vectorized scoring matches looping update over full windows"""
+        rng = np.random.default_rng(0)
+        labels = rng.integers(0, 14, size=100)
+        mv = MajorityVote(window_size=5)
+        
+        looped = [mv.update(int(l)) for l in labels][mv.window_size - 1:]
+        result = MajorityVote(window_size=5).score_sequence(labels)
+        
+        assert len(result) == len(labels) - 4
+        np.testing.assert_array_equal(result, looped)
+    
+    def test_majority_vote_score_sequence_short(self):
+        """Test sequences shorter than the window score nothing"""
+        mv = MajorityVote(window_size=5)
+        assert len(mv.score_sequence([1, 2, 3])) == 0
+    
+    def test_majority_vote_score_sequence_rejects_out_of_range_label(self):
+        """Test score_sequence validates labels like update()"""
+        mv = MajorityVote(window_size=3, num_classes=4)
+        
+        with pytest.raises(ValueError, match="label must be in"):
+            mv.score_sequence([0, 1, 4, 2])
+        with pytest.raises(ValueError, match="label must be in"):
+            mv.score_sequence([0, -1])
+
+
 class TestSmoothingComparison:
     """Compare different smoothing techniques"""
     
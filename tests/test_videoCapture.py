@@ -1,347 +1,544 @@
 """
-Unit tests for vid_stream.py/videoCapture.py - Video capture functionality
+Unit tests for vid_stream.py/videoCapture.py - Multi-source chunked recording
 """
 
-import pytest
+import io
 import os
 import json
-import tempfile
 import time
-from unittest.mock import Mock, patch, MagicMock, mock_open
-import cv2
-import sys
+import threading
 import importlib.util
+from pathlib import Path
 
-# Add parent directory to path
-sys.path.insert(0, '/Users/tejaskoli/terra-civitas-1')
+import numpy as np
+import pytest
+from tests.conftest import rand_frame
 
-# Import videoCapture module dynamically
+# vid_stream.py is a directory, not a package, so load the module by path
 spec = importlib.util.spec_from_file_location(
-    "videoCapture", 
-    os.path.join(os.path.dirname(__file__), "../vid_stream.py/videoCapture.py")
+    "videoCapture",
+    Path(__file__).parent.parent / "vid_stream.py" / "videoCapture.py"
 )
-if spec and spec.loader:
-    videoCapture_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(videoCapture_module)
-    record_webcam_chunks_json = videoCapture_module.record_webcam_chunks_json
-else:
-    # Fallback: define a mock if import fails
-    def record_webcam_chunks_json(*args, **kwargs):
-        return []
-
-
-class TestRecordWebcamChunksJson:
-    """Test webcam recording functionality"""
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    @patch('cv2.imshow')
-    @patch('cv2.waitKey')
-    @patch('cv2.destroyAllWindows')
-    def test_record_webcam_initialization(self, mock_destroy, mock_waitkey, mock_imshow, 
-                                          mock_writer, mock_capture):
-        """Test webcam recording initializes correctly"""
-        # Setup mocks
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        mock_cap.read.return_value = (False, None)  # End recording immediately
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        
-        mock_waitkey.return_value = 0xFF  # Not 'q'
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            json_file = os.path.join(temp_dir, "test.json")
-            
-            result = record_webcam_chunks_json(
-                save_dir=temp_dir,
-                json_file=json_file,
-                total_duration=0.1,  # Very short
-                chunk_duration=0.05
-            )
-            
-            # Should return list
-            assert isinstance(result, list)
-    
-    @patch('cv2.VideoCapture')
-    def test_record_webcam_camera_not_available(self, mock_capture):
-        """Test error handling when camera is not available"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = False
-        mock_capture.return_value = mock_cap
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            result = record_webcam_chunks_json(
-                save_dir=temp_dir,
-                total_duration=1,
-                chunk_duration=1
-            )
-            
-            assert result == []
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    def test_json_file_creation(self, mock_writer, mock_capture):
-        """Test JSON metadata file is created"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        mock_cap.read.return_value = (False, None)
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            json_file = os.path.join(temp_dir, "videos.json")
-            
-            record_webcam_chunks_json(
-                save_dir=temp_dir,
-                json_file=json_file,
-                total_duration=0.1,
-                chunk_duration=0.05
-            )
-            
-            # JSON file should be created (or already exist)
-            # (depends on mocking details)
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    @patch('cv2.imshow')
-    @patch('cv2.waitKey')
-    @patch('cv2.destroyAllWindows')
-    def test_record_respects_chunk_duration(self, mock_destroy, mock_waitkey, mock_imshow,
-                                            mock_writer, mock_capture):
-        """Test that chunks respect duration limit"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        
-        # Create mock frames
-        mock_frame = MagicMock()
-        mock_cap.read.return_value = (True, mock_frame)
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        mock_writer_factory = MagicMock(return_value=mock_out)
-        
-        mock_waitkey.return_value = 0xFF
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with patch('cv2.VideoWriter', mock_writer_factory):
-                start_time = time.time()
-                
-                record_webcam_chunks_json(
-                    save_dir=temp_dir,
-                    total_duration=0.2,
-                    chunk_duration=0.1
-                )
-                
-                elapsed = time.time() - start_time
-                # Should complete in reasonable time
-                assert elapsed < 2.0  # Allow 2 seconds for setup
-
-
-class TestVideoMetadataJson:
-    """Test JSON metadata handling"""
-    
-    def test_json_structure(self):
-        """Test that JSON has correct structure"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            json_file = os.path.join(temp_dir, "test.json")
-            
-            # Create test metadata
-            metadata = [
-                {"path": "video1.mp4", "timestamp": "2025-01-01 12:00:00"},
-                {"path": "video2.mp4", "timestamp": "2025-01-01 12:00:05"},
-            ]
-            
-            with open(json_file, 'w') as f:
-                json.dump(metadata, f, indent=4)
-            
-            # Verify structure
-            with open(json_file, 'r') as f:
-                loaded = json.load(f)
-            
-            assert isinstance(loaded, list)
-            assert all('path' in item and 'timestamp' in item for item in loaded)
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    @patch('cv2.imshow')
-    @patch('cv2.waitKey')
-    @patch('cv2.destroyAllWindows')
-    def test_existing_json_append(self, mock_destroy, mock_waitkey, mock_imshow,
-                                   mock_writer, mock_capture):
-        """Test that new records append to existing JSON"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        mock_cap.read.return_value = (False, None)
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        mock_waitkey.return_value = 0xFF
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            json_file = os.path.join(temp_dir, "videos.json")
-            
-            # Create initial JSON
-            initial_data = [
-                {"path": "existing.mp4", "timestamp": "2025-01-01 12:00:00"}
-            ]
-            with open(json_file, 'w') as f:
-                json.dump(initial_data, f)
-            
-            # Record new data
-            record_webcam_chunks_json(
-                save_dir=temp_dir,
-                json_file=json_file,
-                total_duration=0.1,
-                chunk_duration=0.05
-            )
-            
-            # Check that file still valid JSON
-            with open(json_file, 'r') as f:
-                data = json.load(f)
-            
-            assert isinstance(data, list)
-
-
-class TestVideoWriterConfiguration:
-    """Test video writer configuration"""
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    @patch('cv2.imshow')
-    @patch('cv2.waitKey')
-    @patch('cv2.destroyAllWindows')
-    def test_video_writer_codec(self, mock_destroy, mock_waitkey, mock_imshow,
-                                mock_writer, mock_capture):
-        """Test that correct codec is used"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        mock_cap.read.return_value = (False, None)
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        mock_waitkey.return_value = 0xFF
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            record_webcam_chunks_json(
-                save_dir=temp_dir,
-                total_duration=0.1,
-                chunk_duration=0.05
-            )
-            
-            # Verify VideoWriter was called
-            assert mock_writer.called
-            
-            # Check fourcc argument (second argument)
-            call_args = mock_writer.call_args
-            if call_args:
-                # fourcc should be for 'mp4v'
-                assert call_args is not None
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    @patch('cv2.imshow')
-    @patch('cv2.waitKey')
-    @patch('cv2.destroyAllWindows')
-    def test_target_size_respected(self, mock_destroy, mock_waitkey, mock_imshow,
-                                    mock_writer, mock_capture):
-        """Test that target_size is respected"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        mock_cap.read.return_value = (False, None)
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        mock_waitkey.return_value = 0xFF
-        
-        target_size = (320, 240)
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            record_webcam_chunks_json(
-                save_dir=temp_dir,
-                total_duration=0.1,
-                chunk_duration=0.05,
-                target_size=target_size
-            )
-            
-            # VideoWriter should be called with target_size
-            assert mock_writer.called
-
-
-class TestVideoCaptureBehavior:
-    """Test video capture behavior"""
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    @patch('cv2.imshow')
-    @patch('cv2.waitKey')
-    @patch('cv2.destroyAllWindows')
-    def test_frame_resize(self, mock_destroy, mock_waitkey, mock_imshow,
-                          mock_writer, mock_capture):
-        """Test that frames are resized to target size"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        
-        # Create mock frame data
-        import numpy as np
-        mock_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-        mock_cap.read.return_value = (True, mock_frame)
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        mock_waitkey.return_value = 0xFF
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            with patch('cv2.resize') as mock_resize:
-                mock_resize.return_value = np.zeros((224, 224, 3))
-                
-                record_webcam_chunks_json(
-                    save_dir=temp_dir,
-                    total_duration=0.1,
-                    chunk_duration=0.05,
-                    target_size=(224, 224)
-                )
-                
-                # cv2.resize should be called
-                # (may or may not be called depending on mocking)
-    
-    @patch('cv2.VideoCapture')
-    @patch('cv2.VideoWriter')
-    @patch('cv2.imshow')
-    @patch('cv2.waitKey')
-    @patch('cv2.destroyAllWindows')
-    def test_user_quit(self, mock_destroy, mock_waitkey, mock_imshow,
-                       mock_writer, mock_capture):
-        """Test that 'q' key stops recording"""
-        mock_cap = MagicMock()
-        mock_cap.isOpened.return_value = True
-        
-        import numpy as np
-        mock_frame = np.zeros((480, 640, 3))
-        mock_cap.read.return_value = (True, mock_frame)
-        mock_capture.return_value = mock_cap
-        
-        mock_out = MagicMock()
-        mock_writer.return_value = mock_out
-        
-        # First call: normal frame, second call: 'q' pressed
-        mock_waitkey.side_effect = [0xFF, ord('q')]
-        
-        with tempfile.TemporaryDirectory() as temp_dir:
-            result = record_webcam_chunks_json(
-                save_dir=temp_dir,
-                total_duration=10,  # Long duration
-                chunk_duration=5
-            )
-            
-            # Should return metadata (may be empty if mocking prevents recording)
-            assert isinstance(result, list)
+vc = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(vc)
+
+
+class FakeCapture:
+    """Capture that returns the given frames, then fails every read"""
+
+    def __init__(self, frames=(), opened=True):
+        self.frames = list(frames)
+        self.opened = opened
+        self.released = False
+        self.props = {}
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if self.frames:
+            return True, self.frames.pop(0)
+        return False, None
+
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+
+    def release(self):
+        self.released = True
+
+
+class FakeWorker:
+    """Stands in for CameraWorker: hands out frames (None once exhausted)"""
+
+    def __init__(self, frames=(), connected=True, on_get=None):
+        self.frames = list(frames)
+        self.connected = connected
+        self.on_get = on_get
+        self.stopped = False
+
+    def get(self, timeout=1.0):
+        if self.on_get is not None:
+            self.on_get()
+        return self.frames.pop(0) if self.frames else None
+
+    def stop(self):
+        self.stopped = True
+
+
+class FakeWriter:
+    """Chunk writer that keeps copies of the frames written to it"""
+
+    def __init__(self, fail_release=False):
+        self.frames = []
+        self.released = False
+        self.fail_release = fail_release
+
+    def write(self, frame):
+        self.frames.append(frame.copy())
+
+    def release(self):
+        self.released = True
+        if self.fail_release:
+            raise BrokenPipeError("ffmpeg exited")
+
+
+class FakePipe:
+    """ffmpeg stdin: collects bytes, or raises once broken"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.broken = False
+        self.closed = False
+
+    def write(self, data):
+        if self.broken:
+            raise BrokenPipeError("ffmpeg exited")
+        self.data += bytes(data)
+
+    def close(self):
+        self.closed = True
+        if self.broken:
+            raise BrokenPipeError("ffmpeg exited")
+
+
+class FakeProc:
+    """subprocess.Popen stand-in for the ffmpeg segmenter"""
+
+    def __init__(self, args, stdin=None):
+        self.args = args
+        self.stdin = FakePipe()
+        self.returncode = None
+        self.waited = False
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self):
+        self.waited = True
+        return self.returncode
+
+
+def quit_after(n, event):
+    """on_get callback that sets event on the n-th call"""
+    calls = []
+
+    def on_get():
+        calls.append(None)
+        if len(calls) == n:
+            event.set()
+    return on_get
+
+
+@pytest.fixture
+def opened_writers(monkeypatch):
+    """Replace _open_writer with FakeWriters, recording the path of each"""
+    opened = []
+
+    def open_writer(path, fps, size):
+        writer = FakeWriter()
+        opened.append((path, writer))
+        return writer
+
+    monkeypatch.setattr(vc, "_open_writer", open_writer)
+    return opened
+
+
+class TestRecordLoop:
+    """Test chunking and metadata in the record loop"""
+
+    def test_chunk_boundaries_and_metadata(self, tmp_path):
+        """Test a metadata line per source per chunk, including the final partial one"""
+        quit_event = threading.Event()
+        frames = [rand_frame(6, 8, 3) for _ in range(10)]
+        workers = [
+            FakeWorker(frames, on_get=quit_after(10, quit_event)),
+            FakeWorker(frames),
+        ]
+        writers = [FakeWriter(), FakeWriter()]
+        patterns = [str(tmp_path / "a_%05d.mp4"), str(tmp_path / "b_%05d.mp4")]
+        json_file = tmp_path / "videos.jsonl"
+
+        written = vc._record(workers, writers, patterns, ["a", "b"], str(json_file), (8, 6),
+                             fps=1000, frames_per_chunk=4, total_duration=10, show=False,
+                             quit_event=quit_event)
+
+        assert written == 10
+        assert all(len(w.frames) == 10 and w.released for w in writers)
+        assert all(w.stopped for w in workers)
+        np.testing.assert_array_equal(writers[0].frames[3], frames[3])
+
+        records = list(vc.load_metadata(str(json_file)))
+        assert [(r["source"], r["path"]) for r in records] == [
+            (label, str(tmp_path / f"{label}_{chunk:05d}.mp4"))
+            for chunk in range(3) for label in ("a", "b")
+        ]
+        assert all(set(r) == {"timestamp", "source", "path"} for r in records)
+
+    def test_placeholder_for_failed_source(self, tmp_path):
+        """Test a source without a frame gets a black frame of the target size"""
+        quit_event = threading.Event()
+        workers = [FakeWorker(on_get=quit_after(2, quit_event))]
+        writers = [FakeWriter()]
+
+        vc._record(workers, writers, [str(tmp_path / "a_%05d.mp4")], ["a"], str(tmp_path / "v.jsonl"),
+                   (8, 6), fps=1000, frames_per_chunk=4, total_duration=10, show=False,
+                   quit_event=quit_event)
+
+        assert len(writers[0].frames) == 2
+        assert writers[0].frames[0].shape == (6, 8, 3)
+        assert not writers[0].frames[0].any()
+
+    def test_all_sources_disconnected_paced_to_fps(self, tmp_path):
+        """Test placeholders are written in real time when every source is down"""
+        workers = [FakeWorker(connected=False), FakeWorker(connected=False)]
+        writers = [FakeWriter(), FakeWriter()]
+
+        start = time.monotonic()
+        written = vc._record(workers, writers, [str(tmp_path / "a_%05d.mp4"), str(tmp_path / "b_%05d.mp4")],
+                             ["a", "b"], str(tmp_path / "v.jsonl"), (8, 6), fps=50, frames_per_chunk=5,
+                             total_duration=0.2, show=False)
+
+        assert time.monotonic() - start >= 0.2
+        # 0.2s at 50 fps is 10 frames; allow for the first frame and timer slack
+        assert 8 <= written <= 12
+        assert all(len(w.frames) == written for w in writers)
+
+    def test_failed_release_does_not_skip_others(self, tmp_path):
+        """Test one writer failing to finalize still releases the rest and writes metadata"""
+        quit_event = threading.Event()
+        workers = [FakeWorker(on_get=quit_after(3, quit_event)), FakeWorker()]
+        writers = [FakeWriter(fail_release=True), FakeWriter()]
+        json_file = tmp_path / "videos.jsonl"
+
+        vc._record(workers, writers, [str(tmp_path / "a_%05d.mp4"), str(tmp_path / "b_%05d.mp4")],
+                   ["a", "b"], str(json_file), (8, 6), fps=1000, frames_per_chunk=4,
+                   total_duration=10, show=False, quit_event=quit_event)
+
+        assert writers[1].released
+        assert len(list(vc.load_metadata(str(json_file)))) == 2
+
+
+class TestChunkWriters:
+    """Test the ffmpeg segmenter and the OpenCV fallback writer"""
+
+    def test_opencv_writer_rolls_over_per_chunk(self, opened_writers):
+        """Test a new VideoWriter opens every frames_per_chunk frames"""
+        writer = vc._OpenCVChunkWriter("a_%05d.mp4", 20.0, (8, 6), frames_per_chunk=4)
+        for _ in range(10):
+            writer.write(rand_frame(6, 8, 3))
+        writer.release()
+
+        assert [path for path, _ in opened_writers] == ["a_00000.mp4", "a_00001.mp4", "a_00002.mp4"]
+        assert [len(w.frames) for _, w in opened_writers] == [4, 4, 2]
+        assert all(w.released for _, w in opened_writers)
+
+    def test_opencv_writer_takes_over_mid_chunk(self, opened_writers):
+        """Test start resumes at the chunk the recording is in"""
+        writer = vc._OpenCVChunkWriter("a_%05d.mp4", 20.0, (8, 6), frames_per_chunk=4, start=6)
+        for _ in range(3):
+            writer.write(rand_frame(6, 8, 3))
+
+        assert [path for path, _ in opened_writers] == ["a_00001.mp4", "a_00002.mp4"]
+
+    def test_ffmpeg_writer_pipes_raw_frames(self, monkeypatch):
+        """Test frames go to ffmpeg's stdin as raw BGR bytes"""
+        monkeypatch.setattr(vc.subprocess, "Popen", FakeProc)
+        writer = vc._FFmpegSegmentWriter("a_%05d.mp4", 20.0, (8, 6), 5, frames_per_chunk=100)
+        frame = rand_frame(6, 8, 3)
+        writer.write(frame)
+        writer.write(frame)
+        writer.release()
+
+        assert writer.proc.args[-1] == "a_%05d.mp4"
+        assert "segment" in writer.proc.args
+        assert bytes(writer.proc.stdin.data) == frame.tobytes() * 2
+        assert writer.proc.stdin.closed and writer.proc.waited
+
+    def test_ffmpeg_writer_falls_back_when_ffmpeg_exits(self, monkeypatch, opened_writers):
+        """Test an exited ffmpeg hands the recording over to the OpenCV writer"""
+        monkeypatch.setattr(vc.subprocess, "Popen", FakeProc)
+        writer = vc._FFmpegSegmentWriter("a_%05d.mp4", 20.0, (8, 6), 5, frames_per_chunk=4)
+        for _ in range(5):
+            writer.write(rand_frame(6, 8, 3))
+        writer.proc.returncode = 1
+        writer.proc.stdin.broken = True
+
+        writer.write(rand_frame(6, 8, 3))
+        writer.release()
+
+        assert [path for path, _ in opened_writers] == ["a_00001.mp4"]
+        assert len(opened_writers[0][1].frames) == 1 and opened_writers[0][1].released
+
+    def test_ffmpeg_writer_handles_broken_pipe(self, monkeypatch, opened_writers):
+        """Test a pipe that breaks during write falls back instead of raising"""
+        monkeypatch.setattr(vc.subprocess, "Popen", FakeProc)
+        writer = vc._FFmpegSegmentWriter("a_%05d.mp4", 20.0, (8, 6), 5, frames_per_chunk=4)
+        writer.proc.stdin.broken = True
+
+        writer.write(rand_frame(6, 8, 3))
+        writer.release()
+
+        assert [path for path, _ in opened_writers] == ["a_00000.mp4"]
+
+
+class TestCameraWorker:
+    """Test background capture, resizing and reconnects"""
+
+    @pytest.fixture
+    def reopened(self, monkeypatch):
+        """Fast backoff, and reconnects that open failing FakeCaptures"""
+        monkeypatch.setattr(vc, "RECONNECT_BACKOFF_MIN", 0.001)
+        monkeypatch.setattr(vc, "RECONNECT_BACKOFF_MAX", 0.004)
+        caps = []
+
+        def open_capture(*args, **kwargs):
+            caps.append(FakeCapture())
+            caps[-1].open_args = args
+            return caps[-1]
+
+        monkeypatch.setattr(vc.cv2, "VideoCapture", open_capture)
+        return caps
+
+    def test_worker_resizes_frames(self, reopened):
+        """Test frames come out of the worker at the target size"""
+        cap = FakeCapture([rand_frame(12, 16, 3) for _ in range(3)])
+        worker = vc.CameraWorker(0, cap, "cam", (8, 6))
+        worker.start()
+        try:
+            frame = worker.get(timeout=2.0)
+        finally:
+            worker.stop()
+
+        assert frame.shape == (6, 8, 3)
+        assert not worker.is_alive()
+        assert worker.cap.released
+
+    def test_reconnect_backoff(self, reopened):
+        """Test failed reads reopen the source with doubling, capped backoff"""
+        worker = vc.CameraWorker(0, FakeCapture(), "cam", (8, 6))
+
+        backoffs = []
+        for _ in range(4):
+            assert worker._read() is None
+            backoffs.append(worker.backoff)
+
+        assert not worker.connected
+        assert backoffs == [0.002, 0.004, 0.004, 0.004]
+        assert len(reopened) == 4
+
+        worker.cap.frames.append(rand_frame(6, 8, 3))
+        assert worker._read() is not None
+        assert worker.connected and worker.backoff == 0.001
+
+    def test_webcam_reconnects_with_its_backend(self, reopened):
+        """Test a webcam index is reopened through the backend that first opened it"""
+        worker = vc.CameraWorker(0, FakeCapture(), "cam", (8, 6), backend=vc.cv2.CAP_V4L2)
+        worker._read()
+
+        assert reopened[0].open_args == (0, vc.cv2.CAP_V4L2)
+
+    def test_stream_reconnects_with_timeouts(self, reopened):
+        """Test a network stream is reopened with its backend and open/read timeouts"""
+        worker = vc.CameraWorker("http://phone/video", FakeCapture(), "phone", (8, 6),
+                                 backend=vc.cv2.CAP_FFMPEG)
+        worker._read_latest = lambda: (False, None)
+        worker._read()
+
+        assert reopened[0].open_args == ("http://phone/video", vc.cv2.CAP_FFMPEG, vc._STREAM_TIMEOUT_PARAMS)
+
+    def test_get_does_not_wait_on_disconnected_source(self):
+        """Test a dead source returns a placeholder signal immediately"""
+        worker = vc.CameraWorker(0, FakeCapture(), "cam", (8, 6))
+        worker.connected = False
+
+        start = time.monotonic()
+        assert worker.get(timeout=1.0) is None
+        assert time.monotonic() - start < 0.5
+
+
+class TestMetadataFiles:
+    """Test the JSON Lines metadata helpers"""
+
+    def test_load_metadata_missing_file(self, tmp_path):
+        """Test a missing log yields no records"""
+        assert list(vc.load_metadata(str(tmp_path / "missing.jsonl"))) == []
+
+    def test_load_metadata_skips_truncated_lines(self, tmp_path):
+        """Test a partially written last line is ignored"""
+        json_file = tmp_path / "videos.jsonl"
+        vc._append_metadata(str(json_file), "2025-01-01 00:00:00", ["a"], ["a_00000.mp4"])
+        with open(json_file, "ab") as f:
+            f.write(b'{"timestamp": "2025')
+
+        assert list(vc.load_metadata(str(json_file))) == [
+            {"timestamp": "2025-01-01 00:00:00", "source": "a", "path": "a_00000.mp4"}
+        ]
+
+    def test_export_json_array(self, tmp_path):
+        """Test the log converts to a single JSON array"""
+        jsonl_file = tmp_path / "videos.jsonl"
+        json_file = tmp_path / "videos.json"
+        vc._append_metadata(str(jsonl_file), "t0", ["a", "b"], ["a_0.mp4", "b_0.mp4"])
+        vc._append_metadata(str(jsonl_file), "t1", ["a", "b"], ["a_1.mp4", "b_1.mp4"])
+
+        vc.export_json_array(str(jsonl_file), str(json_file))
+
+        with open(json_file) as f:
+            assert json.load(f) == list(vc.load_metadata(str(jsonl_file)))
+
+    def test_export_empty_log(self, tmp_path):
+        """Test an empty log exports an empty array"""
+        json_file = tmp_path / "videos.json"
+        vc.export_json_array(str(tmp_path / "missing.jsonl"), str(json_file))
+
+        with open(json_file) as f:
+            assert json.load(f) == []
+
+
+class FakeTty:
+    """Interactive stdin backed by a pipe"""
+
+    def __init__(self):
+        self.read_fd, self.write_fd = os.pipe()
+
+    def type(self, text):
+        os.write(self.write_fd, text.encode())
+
+    def isatty(self):
+        return True
+
+    def fileno(self):
+        return self.read_fd
+
+    def close(self):
+        for fd in (self.read_fd, self.write_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+@pytest.fixture
+def tty(monkeypatch):
+    """Replace stdin with a FakeTty"""
+    stdin = FakeTty()
+    monkeypatch.setattr(vc.sys, "stdin", stdin)
+    yield stdin
+    stdin.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows reads console keypresses instead of stdin")
+class TestHeadlessQuit:
+    """Test stopping a headless recording from the terminal"""
+
+    def test_quit_on_q(self, tty):
+        """Test entering q sets the quit event"""
+        tty.type("x\nQ\n")
+        quit_event = threading.Event()
+
+        vc._wait_for_quit(quit_event, threading.Event())
+        assert quit_event.is_set()
+
+    def test_watcher_stops_with_recording(self, tty):
+        """Test the watcher returns once stopped, without input"""
+        quit_event, stop_event = threading.Event(), threading.Event()
+        watcher = threading.Thread(target=vc._wait_for_quit, args=(quit_event, stop_event))
+        watcher.start()
+        stop_event.set()
+        watcher.join(timeout=2.0)
+
+        assert not watcher.is_alive()
+        assert not quit_event.is_set()
+
+    def test_eof_ends_watcher(self, tty):
+        """Test a closed terminal ends the watcher without quitting"""
+        os.close(tty.write_fd)
+        quit_event = threading.Event()
+
+        vc._wait_for_quit(quit_event, threading.Event())
+        assert not quit_event.is_set()
+
+    def test_unreadable_stdin(self, monkeypatch):
+        """Test a closed stdin ends the watcher without quitting"""
+        stdin = io.StringIO()
+        stdin.close()
+        monkeypatch.setattr(vc.sys, "stdin", stdin)
+        quit_event = threading.Event()
+
+        vc._wait_for_quit(quit_event, threading.Event())
+        assert not quit_event.is_set()
+
+    def test_record_joins_watcher(self, tty, tmp_path):
+        """Test no watcher is left reading stdin after the recording returns"""
+        quit_event = threading.Event()
+        workers = [FakeWorker(on_get=quit_after(2, quit_event))]
+
+        vc._record(workers, [FakeWriter()], [str(tmp_path / "a_%05d.mp4")], ["a"], str(tmp_path / "v.jsonl"),
+                   (8, 6), fps=1000, frames_per_chunk=4, total_duration=10, show=False,
+                   quit_event=quit_event)
+
+        assert not any(t.name == "quit-watcher" for t in threading.enumerate())
+
+    def test_no_watcher_without_terminal(self, monkeypatch, tmp_path):
+        """Test non-interactive stdin is left alone"""
+        monkeypatch.setattr(vc.sys, "stdin", io.StringIO("q\n"))
+        started = []
+        monkeypatch.setattr(vc, "_wait_for_quit", lambda *args: started.append(args))
+
+        vc._record([FakeWorker()], [FakeWriter()], [str(tmp_path / "a_%05d.mp4")], ["a"],
+                   str(tmp_path / "v.jsonl"), (8, 6), fps=1000, frames_per_chunk=4,
+                   total_duration=0.01, show=False)
+
+        assert started == []
+
+
+class TestStreamOptions:
+    """Test low-latency FFmpeg options are scoped to network stream opens"""
+
+    def test_options_set_only_during_open(self, monkeypatch):
+        """Test the capture options are visible to the open and removed after it"""
+        monkeypatch.delenv("OPENCV_FFMPEG_CAPTURE_OPTIONS", raising=False)
+        seen = []
+
+        def open_capture(*args, **kwargs):
+            seen.append(vc.os.environ.get("OPENCV_FFMPEG_CAPTURE_OPTIONS"))
+            return FakeCapture()
+
+        monkeypatch.setattr(vc.cv2, "VideoCapture", open_capture)
+        vc._open_stream("rtsp://phone:8554/live", vc.cv2.CAP_FFMPEG)
+
+        assert seen == [vc._STREAM_CAPTURE_OPTIONS]
+        assert "nobuffer" not in seen[0]
+        assert "OPENCV_FFMPEG_CAPTURE_OPTIONS" not in vc.os.environ
+
+    def test_user_options_take_precedence(self, monkeypatch):
+        """Test a user-set OPENCV_FFMPEG_CAPTURE_OPTIONS is left alone"""
+        monkeypatch.setenv("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;udp")
+        seen = []
+
+        def open_capture(*args, **kwargs):
+            seen.append(vc.os.environ.get("OPENCV_FFMPEG_CAPTURE_OPTIONS"))
+            return FakeCapture()
+
+        monkeypatch.setattr(vc.cv2, "VideoCapture", open_capture)
+        vc._open_stream("rtsp://phone:8554/live", vc.cv2.CAP_FFMPEG)
+
+        assert seen == ["rtsp_transport;udp"]
+        assert vc.os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] == "rtsp_transport;udp"
+
+
+class TestRecordMultiSource:
+    """Test recorder setup"""
+
+    def test_no_sources_available(self, tmp_path, monkeypatch):
+        """Test recording stops when no source opens"""
+        monkeypatch.setattr(vc.cv2, "VideoCapture", lambda *args, **kwargs: FakeCapture(opened=False))
+        json_file = tmp_path / "videos.jsonl"
+
+        result = vc.record_multi_source_chunks_json(
+            save_dir=str(tmp_path / "recordings"), json_file=str(json_file), show=False
+        )
+
+        assert result is None
+        assert not json_file.exists()
@@ -4,10 +4,16 @@ Unit tests for ml/video_io.py - Video I/O operations
 
 import pytest
 import os
+import itertools
 import tempfile
 import numpy as np
 import cv2
-from ml.video_io import iter_frames
+from unittest.mock import patch
+from ml.video_io import iter_frames, iter_frame_batches, iter_frames_prefetched
+from tests.conftest import rand_frame
+
+# Computed once for every test that writes its own mp4v file
+MP4V = cv2.VideoWriter.fourcc(*'mp4v')
 
 
 class TestIterFrames:
@@ -65,6 +71,42 @@ class TestIterFrames:
             assert frame.min() >= 0
             assert frame.max() <= 255
     
+    def test_iter_frames_resized(self, sample_video_path):
+        """Test frames are resized when size is given"""
+        frames = list(iter_frames(sample_video_path, fps_out=10))
+        resized = [f.copy() for f in iter_frames(sample_video_path, fps_out=10, size=64)]
+        
+        assert len(resized) == len(frames)
+        expected = cv2.resize(frames[0], (64, 64), interpolation=cv2.INTER_AREA)
+        np.testing.assert_array_equal(resized[0], expected)
+    
+    def test_iter_frames_reuses_buffer(self, sample_video_path):
+        """Test resized frames share one buffer unless reuse_buffer is off"""
+        reused = iter_frames(sample_video_path, fps_out=10, size=64)
+        assert next(reused) is next(reused)
+        
+        fresh = iter_frames(sample_video_path, fps_out=10, size=64, reuse_buffer=False)
+        assert next(fresh) is not next(fresh)
+    
+    def test_iter_frames_gray_channels(self, sample_video_path):
+        """Test color='gray' yields single-channel frames"""
+        frames = list(iter_frames(sample_video_path, fps_out=10))
+        gray = [f.copy() for f in iter_frames(sample_video_path, fps_out=10, color="gray")]
+        
+        assert len(gray) == len(frames)
+        assert gray[0].ndim == 2 and gray[0].shape == frames[0].shape[:2]
+        np.testing.assert_array_equal(gray[0], cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY))
+        
+        resized = next(iter_frames(sample_video_path, fps_out=10, size=64, color="gray"))
+        assert resized.shape == (64, 64)
+    
+    def test_iter_frames_yuv420_requires_pyav(self, sample_video_path):
+        """Test planar YUV output is only offered by the PyAV backend"""
+        with pytest.raises(ValueError, match="requires backend='pyav'"):
+            list(iter_frames(sample_video_path, color="yuv420"))
+        with pytest.raises(ValueError, match="Unsupported color"):
+            list(iter_frames(sample_video_path, color="hsv"))
+    
     def test_iter_frames_respects_fps_out_1(self, sample_video_path):
         """Test iter_frames with fps_out=1"""
         frames = list(iter_frames(sample_video_path, fps_out=1))
@@ -111,6 +153,256 @@ class TestIterFrames:
             pass
 
 
+class FakeCapture:
+    """Minimal cv2.VideoCapture stand-in that counts grab/retrieve calls"""
+    
+    def __init__(self, num_frames=30, fps=30.0):
+        self.num_frames = num_frames
+        self.fps = fps
+        self.position = 0
+        self.retrieves = 0
+        self.grabs = 0
+        self.kept = []  # index of the frame behind each retrieve()
+        self.props = {}  # every property passed to set()
+        self.released = False
+    
+    def isOpened(self):
+        return True
+    
+    def get(self, prop):
+        return self.fps if prop == cv2.CAP_PROP_FPS else 0
+    
+    def set(self, prop, value):
+        self.props[prop] = value
+        return False
+    
+    def retrieve(self, image=None):
+        self.retrieves += 1
+        self.kept.append(self.position - 1)
+        return True, np.zeros((4, 4, 3), dtype=np.uint8)
+    
+    def grab(self):
+        self.grabs += 1
+        if self.position >= self.num_frames:
+            return False
+        self.position += 1
+        return True
+    
+    def release(self):
+        self.released = True
+
+
+class TestIterFramesDecoding:
+    """Test that skipped frames are not fully decoded"""
+    
+    def test_iter_frames_grabs_skipped_frames(self):
+        """Test every frame is grabbed but only sampled frames are retrieved"""
+        cap = FakeCapture(num_frames=29, fps=30.0)
+        with patch('ml.video_io.cv2.VideoCapture', return_value=cap):
+            frames = list(iter_frames(__file__, fps_out=2))
+        
+        assert len(frames) == 2
+        assert cap.retrieves == len(frames)
+        assert cap.grabs == cap.num_frames + 1  # final grab hits end of stream
+    
+    def test_iter_frames_shrinks_capture_buffer(self):
+        """Test the capture queue is cut to one frame and released on close"""
+        cap = FakeCapture(num_frames=30, fps=30.0)
+        with patch('ml.video_io.cv2.VideoCapture', return_value=cap):
+            gen = iter_frames(__file__, fps_out=2)
+            next(gen)
+            gen.close()
+        
+        assert cap.props[cv2.CAP_PROP_BUFFERSIZE] == 1
+        assert cap.released
+    
+    def test_iter_frames_accepts_stream_urls(self):
+        """Test network sources are opened without a filesystem check"""
+        cap = FakeCapture(num_frames=30, fps=30.0)
+        with patch('ml.video_io.cv2.VideoCapture', return_value=cap):
+            frames = list(iter_frames("rtsp://camera.local/stream", fps_out=2))
+        
+        assert len(frames) == 2
+    
+    def test_iter_frames_fractional_rate_does_not_drift(self):
+        """Test 29.97 fps sources are sampled at exact frame times"""
+        cap = FakeCapture(num_frames=3000, fps=30000 / 1001)
+        with patch('ml.video_io.cv2.VideoCapture', return_value=cap):
+            list(iter_frames(__file__, fps_out=1))
+        
+        # Rounding the interval to 30 frames would put sample 100 at frame 3000
+        assert cap.kept[:3] == [0, 29, 59]
+        assert cap.kept[100] == 2997
+    
+    def test_iter_frames_seeks_large_intervals(self):
+        """Test intervals of SEEK_MIN_INTERVAL frames or more seek over the gap"""
+        cap = SeekableFakeCapture(num_frames=300, fps=60.0)
+        with patch('ml.video_io.cv2.VideoCapture', return_value=cap):
+            frames = list(iter_frames(__file__, fps_out=1))
+        
+        assert len(frames) == 5
+        assert cap.seeks == [60, 120, 180, 240, 300]
+        assert cap.grabs == len(frames) + 1
+    
+    def test_iter_frames_seek_falls_back_to_grab(self):
+        """Test sources that refuse to seek are still sampled by grabbing"""
+        cap = FakeCapture(num_frames=300, fps=60.0)
+        with patch('ml.video_io.cv2.VideoCapture', return_value=cap):
+            frames = list(iter_frames(__file__, fps_out=1))
+        
+        assert len(frames) == 5
+        assert cap.grabs == cap.num_frames + 1
+    
+    def test_iter_frames_keyframe_only_requires_pyav(self, sample_video_path):
+        """Test keyframe_only is rejected by the OpenCV backend"""
+        with pytest.raises(ValueError, match="keyframe_only"):
+            list(iter_frames(sample_video_path, keyframe_only=True))
+
+
+class SeekableFakeCapture(FakeCapture):
+    """FakeCapture that honours CAP_PROP_POS_FRAMES seeks"""
+    
+    def __init__(self, num_frames=30, fps=30.0):
+        super().__init__(num_frames, fps)
+        self.seeks = []
+    
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self.seeks.append(value)
+        self.position = min(value, self.num_frames)
+        return True
+
+
+class TestIterFramesPyAV:
+    """Test the PyAV decoding backend"""
+    
+    def test_iter_frames_pyav_matches_opencv(self, sample_video_path):
+        """Test PyAV backend samples the same frames as the OpenCV backend"""
+        pytest.importorskip("av")
+        cv_frames = list(iter_frames(sample_video_path, fps_out=2))
+        av_frames = list(iter_frames(sample_video_path, fps_out=2, backend="pyav"))
+        
+        assert len(av_frames) == len(cv_frames)
+        assert all(f.shape == cv_frames[0].shape and f.dtype == np.uint8 for f in av_frames)
+    
+    def test_iter_frames_pyav_keyframe_seek(self, sample_video_path):
+        """Test sub-1 fps sampling through keyframe seeks"""
+        pytest.importorskip("av")
+        frames = list(iter_frames(sample_video_path, fps_out=0.5, backend="pyav"))
+        
+        # 30 frames at 30 fps is one second of video: only t=0 is sampled
+        assert len(frames) == 1
+        assert frames[0].ndim == 3 and frames[0].shape[2] == 3
+    
+    def test_iter_frames_pyav_keyframe_only_long_gop(self, tmp_path):
+        """Test a GOP longer than the sampling period doesn't repeat keyframes"""
+        av = pytest.importorskip("av")
+        video_path = str(tmp_path / "long_gop.mp4")
+        with av.open(video_path, "w") as container:
+            # keyframes only at t=0 and t=2s; sc_threshold keeps scene cuts from adding more
+            stream = container.add_stream("mpeg4", rate=30, options={"sc_threshold": "1000000000"})
+            stream.width, stream.height = 64, 48
+            stream.pix_fmt = "yuv420p"
+            stream.codec_context.gop_size = 60
+            for i in range(90):
+                frame = av.VideoFrame.from_ndarray(np.full((48, 64, 3), 2 * i, np.uint8), format="bgr24")
+                container.mux(stream.encode(frame))
+            container.mux(stream.encode())
+        
+        # cap the count: a repeated keyframe past the end would never stop
+        frames = list(itertools.islice(
+            iter_frames(video_path, fps_out=0.8, backend="pyav", keyframe_only=True), 5
+        ))
+        
+        # ticks at 0, 1.25 and 2.5s snap to the keyframes at 0 and 2s, once each
+        assert len(frames) == 2
+        assert frames[1].mean() > frames[0].mean() + 60
+    
+    def test_iter_frames_pyav_requires_hwaccel_api(self, sample_video_path):
+        """Test a PyAV without hardware decoding (< 14) asks for an upgrade"""
+        pytest.importorskip("av")
+        with patch.dict("sys.modules", {"av.codec.hwaccel": None}):
+            with pytest.raises(RuntimeError, match="requires PyAV >= 14"):
+                list(iter_frames(sample_video_path, backend="pyav"))
+    
+    def test_iter_frames_invalid_backend(self, sample_video_path):
+        """Test unknown backends are rejected"""
+        with pytest.raises(ValueError, match="Unsupported backend"):
+            list(iter_frames(sample_video_path, backend="gstreamer"))
+
+
+class TestIterFrameBatches:
+    """Test batched video frame iteration"""
+    
+    def test_iter_frame_batches_shapes(self, sample_video_path):
+        """Test batches are stacked uint8 BGR arrays"""
+        batches = [b.copy() for b in iter_frame_batches(sample_video_path, fps_out=10, batch_size=2)]
+        
+        assert len(batches) > 0
+        assert all(b.ndim == 4 and b.shape[3] == 3 for b in batches)
+        assert all(b.dtype == np.uint8 for b in batches)
+        assert all(len(b) <= 2 for b in batches)
+    
+    def test_iter_frame_batches_matches_iter_frames(self, sample_video_path):
+        """Test batching yields the same frames as iter_frames"""
+        frames = list(iter_frames(sample_video_path, fps_out=10))
+        batches = [b.copy() for b in iter_frame_batches(sample_video_path, fps_out=10, batch_size=2)]
+        
+        stacked = np.concatenate(batches)
+        assert len(stacked) == len(frames)
+        np.testing.assert_array_equal(stacked, np.stack(frames))
+    
+    def test_iter_frame_batches_resized(self, sample_video_path):
+        """Test frames are resized into the batch buffer when size is given"""
+        frames = list(iter_frames(sample_video_path, fps_out=10))
+        batches = [b.copy() for b in iter_frame_batches(sample_video_path, fps_out=10, batch_size=2, size=64)]
+        
+        stacked = np.concatenate(batches)
+        assert stacked.shape == (len(frames), 64, 64, 3)
+        expected = cv2.resize(frames[0], (64, 64), interpolation=cv2.INTER_AREA)
+        np.testing.assert_array_equal(stacked[0], expected)
+    
+    def test_iter_frame_batches_invalid_size(self, sample_video_path):
+        """Test iter_frame_batches rejects a non-positive size"""
+        with pytest.raises(ValueError, match="size must be greater than 0"):
+            list(iter_frame_batches(sample_video_path, size=0))
+    
+    def test_iter_frame_batches_invalid_batch_size(self, sample_video_path):
+        """Test iter_frame_batches with invalid batch size"""
+        with pytest.raises(ValueError, match="batch_size must be greater than 0"):
+            list(iter_frame_batches(sample_video_path, fps_out=2, batch_size=0))
+
+
+class TestIterFramesPrefetched:
+    """Test background-thread frame prefetching"""
+    
+    def test_iter_frames_prefetched_matches_iter_frames(self, sample_video_path):
+        """Test prefetching yields the same frames in the same order"""
+        frames = list(iter_frames(sample_video_path, fps_out=10))
+        prefetched = list(iter_frames_prefetched(sample_video_path, fps_out=10, prefetch=2))
+        
+        assert len(prefetched) == len(frames)
+        for a, b in zip(prefetched, frames):
+            np.testing.assert_array_equal(a, b)
+    
+    def test_iter_frames_prefetched_early_close(self, sample_video_path):
+        """Test closing the generator early stops the producer thread"""
+        gen = iter_frames_prefetched(sample_video_path, fps_out=30, prefetch=1)
+        next(gen)
+        gen.close()
+    
+    def test_iter_frames_prefetched_propagates_errors(self):
+        """Test producer errors are raised in the consumer"""
+        with pytest.raises(RuntimeError, match="Video file not found"):
+            list(iter_frames_prefetched("/nonexistent/video.mp4"))
+    
+    def test_iter_frames_prefetched_invalid_prefetch(self, sample_video_path):
+        """Test prefetch must be positive"""
+        with pytest.raises(ValueError, match="prefetch must be greater than 0"):
+            list(iter_frames_prefetched(sample_video_path, prefetch=0))
+
+
 class TestIterFramesEdgeCases:
     """Test edge cases for video iteration"""
     
@@ -122,8 +414,7 @@ class TestIterFramesEdgeCases:
         
         try:
             # Create minimal video with 1 frame
-            fourcc = int(cv2.VideoWriter.fourcc('m', 'p', '4', 'v'))
-            out = cv2.VideoWriter(temp_video, fourcc, 30.0, (640, 480))
+            out = cv2.VideoWriter(temp_video, MP4V, 30.0, (640, 480))
             frame = np.zeros((480, 640, 3), dtype=np.uint8)
             out.write(frame)
             out.release()
@@ -164,12 +455,11 @@ class TestVideoCapture:
         try:
             # Create video with specific size
             size = (320, 240)
-            fourcc = int(cv2.VideoWriter.fourcc('m', 'p', '4', 'v'))
-            out = cv2.VideoWriter(temp_video, fourcc, 30.0, size)
+            out = cv2.VideoWriter(temp_video, MP4V, 30.0, size)
             
             # Write frames
             for i in range(10):
-                frame = np.random.randint(0, 255, (240, 320, 3), dtype=np.uint8)
+                frame = rand_frame(240, 320, 3)
                 out.write(frame)
             out.release()
             
@@ -3,38 +3,56 @@ import sys
 
 # set before importing cv2 so native ffmpeg/opencv honors it
 os.environ.setdefault("OPENCV_LOG_LEVEL", "ERROR")
+# AV_LOG_QUIET: silences FFmpeg's per-packet "[mjpeg ...] overread" lines at the
+# source, so frame reads don't need the FD 2 redirect below
+os.environ.setdefault("OPENCV_FFMPEG_LOGLEVEL", "-8")
 
 import contextlib
+import platform
+import queue
+import select
+import shutil
+import subprocess
+import threading
+
+# FD 2 is process-wide, so concurrent readers share one redirect: the first
+# to enter installs it and the last to leave restores the real stderr
+_stderr_lock = threading.Lock()
+_stderr_users = 0
+_stderr_saved = None
 
 @contextlib.contextmanager
 def _suppress_stderr_fd():
     """
     Temporarily redirect native stderr (FD 2) to os.devnull to hide FFmpeg/MJPEG lines.
-    Works on Windows and Unix; best-effort.
+    Works on Windows and Unix; best-effort. Safe to nest across threads.
     """
-    devnull = None
-    old_fd = None
+    global _stderr_users, _stderr_saved
+    with _stderr_lock:
+        _stderr_users += 1
+        if _stderr_users == 1:
+            try:
+                devnull = open(os.devnull, "w")
+                try:
+                    # duplicate stderr fd, then redirect fd 2 -> devnull
+                    _stderr_saved = os.dup(2)
+                    os.dup2(devnull.fileno(), 2)
+                finally:
+                    devnull.close()
+            except Exception:
+                _stderr_saved = None
     try:
-        devnull = open(os.devnull, "w")
-        # duplicate stderr fd
-        old_fd = os.dup(2)
-        # redirect fd 2 -> devnull
-        os.dup2(devnull.fileno(), 2)
-        yield
-    except Exception:
         yield
     finally:
-        try:
-            if old_fd is not None:
-                os.dup2(old_fd, 2)
-                os.close(old_fd)
-        except Exception:
-            pass
-        try:
-            if devnull is not None:
-                devnull.close()
-        except Exception:
-            pass
+        with _stderr_lock:
+            _stderr_users -= 1
+            if _stderr_users == 0 and _stderr_saved is not None:
+                try:
+                    os.dup2(_stderr_saved, 2)
+                    os.close(_stderr_saved)
+                except Exception:
+                    pass
+                _stderr_saved = None
 
 # Temporarily redirect stderr to suppress native FFmpeg/MJPEG logs during cv2 import.
 _devnull = None
@@ -71,7 +89,7 @@ except Exception:
 
 from datetime import datetime
 import time
-import json
+import orjson
 import numpy as np
 from urllib.parse import urlparse
 
@@ -87,14 +105,491 @@ def _label_for_source(src, idx):
     # fallback
     return f"source_{idx}"
 
+def _check_cpu_dispatch():
+    """Warn when an x86 OpenCV build lacks AVX2 kernels (resize/color conversion fall back to SSE)"""
+    if platform.machine().lower() not in ("x86_64", "amd64"):
+        return
+    if "AVX2" not in cv2.getBuildInformation():
+        print("Warning: OpenCV was built without AVX2 dispatch; install the opencv-python wheel for faster resizes.")
+
+# fourcc codes for chunk writers, computed once instead of per chunk
+_FOURCC_AVC1 = cv2.VideoWriter_fourcc(*'avc1')
+_FOURCC_MP4V = cv2.VideoWriter_fourcc(*'mp4v')
+
+def load_metadata(json_file="videos.jsonl"):
+    """
+    Yield the chunk records written by the recorder, one dict per line.
+    
+    Blank or truncated lines (e.g. from a crash mid-write) are skipped.
+    """
+    if not os.path.exists(json_file):
+        return
+    with open(json_file, "rb") as f:
+        for line in f:
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+
+# H.264 writer params tried in order: any hardware encoder OpenCV's FFmpeg
+# backend can reach (NVENC, QSV/MFX, AMF/D3D11, VAAPI, VideoToolbox), then
+# software H.264 (x264/OpenH264)
+_AVC1_WRITER_PARAMS = (
+    [cv2.VIDEOWRITER_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY],
+    [],
+)
+
+def export_json_array(jsonl_file="videos.jsonl", json_file="videos.json"):
+    """
+    Write the recorder's JSON Lines metadata out as one JSON array.
+    
+    For consumers that still expect the legacy videos.json layout. Lines
+    are copied through one at a time, so the log is never loaded whole.
+    """
+    with open(json_file, "wb") as out:
+        out.write(b"[")
+        for i, record in enumerate(load_metadata(jsonl_file)):
+            if i:
+                out.write(b",\n")
+            out.write(orjson.dumps(record))
+        out.write(b"]\n")
+
+def _open_writer(path, fps, size):
+    """
+    Open a chunk writer, preferring H.264 on a hardware encoder.
+    
+    Falls back to software H.264, then to mp4v for builds without any
+    H.264 encoder.
+    """
+    for params in _AVC1_WRITER_PARAMS:
+        try:
+            # suppress FFmpeg's noise when the encoder is unavailable
+            with _suppress_stderr_fd():
+                out = cv2.VideoWriter(path, cv2.CAP_FFMPEG, _FOURCC_AVC1, fps, size, params)
+            if out.isOpened():
+                return out
+            out.release()
+        except Exception:
+            pass
+    return cv2.VideoWriter(path, _FOURCC_MP4V, fps, size)
+
+class _FFmpegSegmentWriter:
+    """
+    Streams raw BGR frames into one long-lived ffmpeg process per source.
+    
+    ffmpeg's segment muxer splits the stream into chunk files itself, with
+    a forced keyframe at every boundary. The encoder is initialized once
+    per recording instead of once per chunk, and no frames are lost while
+    a new chunk is opened. pattern holds a %05d chunk index.
+    
+    If ffmpeg exits early (bad encoder, full disk), the rest of the
+    recording goes through an _OpenCVChunkWriter that picks up at the
+    current chunk, so chunk paths stay the ones the metadata names.
+    """
+    def __init__(self, pattern, fps, size, chunk_duration, frames_per_chunk):
+        width, height = size
+        self.pattern = pattern
+        self.fps = fps
+        self.size = size
+        self.frames_per_chunk = frames_per_chunk
+        self.written = 0
+        self.fallback = None
+        self.proc = subprocess.Popen([
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps), "-i", "-",
+            "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency", "-pix_fmt", "yuv420p",
+            "-force_key_frames", f"expr:gte(t,n_forced*{chunk_duration})",
+            "-f", "segment", "-segment_time", str(chunk_duration), "-reset_timestamps", "1",
+            pattern,
+        ], stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        if self.fallback is None:
+            if self.proc.poll() is None:
+                try:
+                    self.proc.stdin.write(np.ascontiguousarray(frame).data)
+                    self.written += 1
+                    return
+                except OSError:
+                    # BrokenPipeError: ffmpeg exited between poll() and write()
+                    pass
+            print(f"Warning: ffmpeg exited for {self.pattern} (code {self.proc.poll()}), "
+                  "continuing with the OpenCV writer")
+            self._close_proc()
+            self.fallback = _OpenCVChunkWriter(
+                self.pattern, self.fps, self.size, self.frames_per_chunk, start=self.written
+            )
+        self.fallback.write(frame)
+
+    def release(self):
+        try:
+            if self.fallback is not None:
+                self.fallback.release()
+        finally:
+            self._close_proc()
+
+    def _close_proc(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            # flushing into a dead ffmpeg raises BrokenPipeError
+            pass
+        self.proc.wait()
+
+class _OpenCVChunkWriter:
+    """
+    Fallback when ffmpeg is not installed: a new VideoWriter every frames_per_chunk frames.
+    
+    start is the number of frames already recorded, for taking over a
+    recording mid-chunk.
+    """
+    def __init__(self, pattern, fps, size, frames_per_chunk, start=0):
+        self.pattern = pattern
+        self.fps = fps
+        self.size = size
+        self.frames_per_chunk = frames_per_chunk
+        self.out = None
+        self.written = start
+
+    def write(self, frame):
+        if self.out is None or self.written % self.frames_per_chunk == 0:
+            if self.out is not None:
+                self.out.release()
+            self.out = _open_writer(self.pattern % (self.written // self.frames_per_chunk), self.fps, self.size)
+        self.out.write(frame)
+        self.written += 1
+
+    def release(self):
+        if self.out is not None:
+            self.out.release()
+
+def _open_chunk_writer(pattern, fps, size, chunk_duration, frames_per_chunk):
+    if shutil.which("ffmpeg"):
+        return _FFmpegSegmentWriter(pattern, fps, size, chunk_duration, frames_per_chunk)
+    return _OpenCVChunkWriter(pattern, fps, size, frames_per_chunk)
+
+if os.name == "nt":
+    import msvcrt
+
+# How often the headless quit watcher checks whether the recording ended (seconds)
+QUIT_POLL_SECONDS = 0.2
+
+def _wait_for_quit(quit_event, stop_event):
+    """
+    Set quit_event when 'q' is entered on the terminal, until stop_event is set.
+    
+    Polls instead of blocking in readline(), so the watcher exits with the
+    recording rather than lingering on the caller's stdin.
+    """
+    try:
+        while not stop_event.is_set():
+            if os.name == "nt":
+                # select() only takes sockets on Windows; read console keypresses instead
+                if msvcrt.kbhit() and msvcrt.getwch().lower() == "q":
+                    quit_event.set()
+                    return
+                stop_event.wait(QUIT_POLL_SECONDS)
+            elif select.select([sys.stdin], [], [], QUIT_POLL_SECONDS)[0]:
+                # os.read, not readline(): lines left in Python's buffer are invisible to select()
+                data = os.read(sys.stdin.fileno(), 1024)
+                if not data:
+                    # EOF
+                    return
+                if any(line.strip().lower() == b"q" for line in data.splitlines()):
+                    quit_event.set()
+                    return
+    except (OSError, ValueError):
+        # stdin closed or not readable
+        pass
+
+def _append_metadata(json_file, timestamp, labels, paths):
+    # append one JSON line per source; earlier records are never rewritten
+    with open(json_file, "ab") as f:
+        for label, path in zip(labels, paths):
+            f.write(orjson.dumps({
+                "timestamp": timestamp,
+                "source": label,
+                "path": path
+            }) + b"\n")
+
+# Bound how long opening or reading a dead network stream can block (ms)
+_STREAM_TIMEOUT_PARAMS = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, 3000, cv2.CAP_PROP_READ_TIMEOUT_MSEC, 2000]
+
+# Low-latency demuxing for network streams: TCP for RTSP, no B-frame
+# reordering. Phone apps that offer RTSP (rtsp://host:8554/...) send H.264 at
+# a fraction of the MJPEG-over-HTTP bitrate; prefer those URLs
+_STREAM_CAPTURE_OPTIONS = "rtsp_transport;tcp|flags;low_delay|max_delay;100000|reorder_queue_size;0"
+_capture_options_lock = threading.Lock()
+
+def _open_stream(src, backend):
+    """
+    Open a network stream with the low-latency FFmpeg options and timeouts.
+    
+    OpenCV reads OPENCV_FFMPEG_CAPTURE_OPTIONS on every open, so the
+    variable is only set for the duration of this one, leaving file
+    captures elsewhere in the process untouched. A value the user set
+    takes precedence.
+    """
+    with _capture_options_lock:
+        scoped = "OPENCV_FFMPEG_CAPTURE_OPTIONS" not in os.environ
+        if scoped:
+            os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = _STREAM_CAPTURE_OPTIONS
+        try:
+            return cv2.VideoCapture(src, backend, _STREAM_TIMEOUT_PARAMS)
+        finally:
+            if scoped:
+                del os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"]
+
+# A grab that returns faster than this came out of the backend's buffer rather
+# than off the network, so the frame is already stale
+STALE_GRAB_SECONDS = 0.005
+# Upper bound on buffered frames skipped per read
+MAX_STALE_GRABS = 30
+
+# Delay before reopening a failed source, doubled per failed attempt (seconds)
+RECONNECT_BACKOFF_MIN = 0.25
+RECONNECT_BACKOFF_MAX = 30.0
+
+class CameraWorker(threading.Thread):
+    """
+    Reads and resizes one capture on a background thread.
+    
+    Only the latest frame is kept (a size-1 queue that drops the oldest), so
+    blocking reads on several sources overlap and the recorder never falls
+    behind a fast camera. While reads fail, None is queued so the recorder
+    writes a placeholder, and the source is reopened with exponential backoff.
+    
+    Resizes go into a pool of three preallocated buffers: one being filled,
+    one queued and one held by the recorder, which hands it back on its next
+    get(). A frame from get() is therefore only valid until the next call.
+    
+    backend is the capture API that opened cap; reconnects reuse it, since
+    a webcam index can't be reopened through CAP_FFMPEG.
+    """
+    def __init__(self, src, cap, label, size, use_opencl=False, backend=cv2.CAP_ANY):
+        super().__init__(name=f"camera-{label}", daemon=True)
+        self.src = src
+        self.cap = cap
+        self.backend = backend
+        self.label = label
+        self.size = size
+        self.use_opencl = use_opencl
+        self.q = queue.Queue(maxsize=1)
+        self.stop_event = threading.Event()
+        width, height = size
+        buffers = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(3)]
+        self._buffer_ids = {id(b) for b in buffers}
+        self._free = queue.SimpleQueue()
+        for b in buffers:
+            self._free.put(b)
+        self._held = None
+        self.connected = True
+        self.backoff = RECONNECT_BACKOFF_MIN
+
+    def run(self):
+        while not self.stop_event.is_set():
+            frame = self._read()
+            if frame is not None and frame.shape[1::-1] != self.size:
+                # box filter when shrinking; nearest is enough for recording otherwise
+                shrinking = frame.shape[1] > self.size[0] or frame.shape[0] > self.size[1]
+                interpolation = cv2.INTER_AREA if shrinking else cv2.INTER_NEAREST
+                if self.use_opencl:
+                    # T-API: resize runs as an OpenCL kernel; get() downloads a fresh array
+                    frame = cv2.resize(cv2.UMat(frame), self.size, interpolation=interpolation).get()
+                else:
+                    frame = cv2.resize(frame, self.size, dst=self._free.get(), interpolation=interpolation)
+            # replace any frame the recorder hasn't taken yet
+            try:
+                self._recycle(self.q.get_nowait())
+            except queue.Empty:
+                pass
+            self.q.put_nowait(frame)
+
+    def _recycle(self, frame):
+        if frame is not None and id(frame) in self._buffer_ids:
+            self._free.put(frame)
+
+    def _read_latest(self):
+        """
+        Skip frames a network stream has buffered and convert only the freshest.
+        
+        Grabbing does not run the BGR conversion, so frames that queued up
+        while the worker lagged cost little to drop. Local webcams already
+        keep a one-frame driver buffer and are read directly.
+        """
+        if not isinstance(self.src, str):
+            return self.cap.read()
+        for _ in range(MAX_STALE_GRABS):
+            start = time.monotonic()
+            if not self.cap.grab():
+                return False, None
+            if time.monotonic() - start > STALE_GRAB_SECONDS:
+                # this frame arrived live, so nothing newer is buffered
+                break
+        return self.cap.retrieve()
+
+    def _read(self):
+        ret, frame = self._read_latest()
+        if ret and frame is not None:
+            self.connected = True
+            self.backoff = RECONNECT_BACKOFF_MIN
+            return frame
+
+        self.connected = False
+        print(f"Warning: read failed for {self.label}, reconnecting in {self.backoff:g}s...")
+        self.cap.release()
+        # back off exponentially while the source stays down; wakes early on stop
+        if not self.stop_event.wait(self.backoff):
+            self.backoff = min(self.backoff * 2, RECONNECT_BACKOFF_MAX)
+            self._reconnect()
+        return None
+
+    def _reconnect(self):
+        try:
+            # suppress FFmpeg stderr during reconnect/open
+            with _suppress_stderr_fd():
+                try:
+                    if isinstance(self.src, str):
+                        new_cap = _open_stream(self.src, self.backend)
+                    else:
+                        new_cap = cv2.VideoCapture(self.src, self.backend)
+                except Exception:
+                    new_cap = cv2.VideoCapture(self.src)
+            try:
+                new_cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            except Exception:
+                pass
+            self.cap = new_cap
+        except Exception:
+            pass
+
+    def get(self, timeout=1.0):
+        """Latest resized frame, or None if the source failed or produced nothing in time"""
+        try:
+            if self.connected:
+                frame = self.q.get(timeout=timeout)
+            else:
+                # don't let a dead source hold up the others
+                frame = self.q.get_nowait()
+        except queue.Empty:
+            return None
+        # the recorder is done with the previous frame once it asks for the next
+        self._recycle(self._held)
+        self._held = frame
+        return frame
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+        self.cap.release()
+
+def _record(workers, writers, patterns, labels, json_file, size, fps, frames_per_chunk,
+            total_duration, show, quit_event=None):
+    """
+    Pull frames from the workers into the writers until time runs out or 'q'.
+    
+    Appends a metadata line per source whenever a chunk of frames_per_chunk
+    frames completes, plus one for a final partial chunk. Stops the workers
+    and releases the writers on exit. Frames are written at most fps times
+    a second. 'q' is read from the OpenCV window when show is set; headless,
+    only an interactive terminal on stdin is watched for it (CLI use).
+    Returns the number of frames written per source.
+    """
+    width, height = size
+    # shared black frame written for sources with no frame available
+    placeholder = np.zeros((height, width, 3), dtype=np.uint8)
+
+    # monotonic deadline: immune to wall-clock adjustments and cheap to poll per frame
+    end_time = time.monotonic() + total_duration
+    if quit_event is None:
+        quit_event = threading.Event()
+    stop_watcher = threading.Event()
+    watcher = None
+    if show:
+        # all sources side by side in one window: one GUI upload per frame instead of one per source
+        mosaic = np.empty((height, width * len(workers), 3), dtype=np.uint8)
+        print("Recording started. Press 'q' in the OpenCV window to stop.")
+    elif sys.stdin is not None and sys.stdin.isatty():
+        # headless CLI: no GUI event loop to poll, so watch the terminal for 'q' instead
+        watcher = threading.Thread(
+            target=_wait_for_quit, args=(quit_event, stop_watcher), name="quit-watcher", daemon=True
+        )
+        watcher.start()
+        print("Recording started. Enter 'q' to stop.")
+    else:
+        # headless without a terminal (service, pipe): stops at total_duration
+        print("Recording started.")
+
+    written = 0
+    timestamp = None
+    frame_period = 1.0 / fps
+    next_frame = time.monotonic()
+    try:
+        while time.monotonic() < end_time and not quit_event.is_set():
+            if written % frames_per_chunk == 0:
+                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+            for cap_idx, worker in enumerate(workers):
+                frame = worker.get(timeout=1.0)
+
+                if frame is None:
+                    # black placeholder on persistent failure
+                    frame = placeholder
+                writers[cap_idx].write(frame)
+                if show:
+                    mosaic[:, cap_idx * width:(cap_idx + 1) * width] = frame
+
+            if show:
+                cv2.imshow("Sources", mosaic)
+
+            written += 1
+            if written % frames_per_chunk == 0:
+                chunk = written // frames_per_chunk - 1
+                _append_metadata(json_file, timestamp, labels, [p % chunk for p in patterns])
+
+            if show and cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+            # pace to fps: with every source down, get() returns at once and
+            # placeholders would otherwise be written faster than real time
+            next_frame += frame_period
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                quit_event.wait(delay)
+            else:
+                # running behind: don't burst to catch up
+                next_frame = time.monotonic()
+
+    finally:
+        stop_watcher.set()
+        if watcher is not None:
+            watcher.join()
+        for worker in workers:
+            worker.stop()
+        for w in writers:
+            # one broken writer must not keep the others (or the metadata) from finishing
+            try:
+                w.release()
+            except Exception as e:
+                print(f"Warning: failed to finalize writer: {e}")
+        if written % frames_per_chunk:
+            # record the final, partial chunk
+            chunk = written // frames_per_chunk
+            _append_metadata(json_file, timestamp, labels, [p % chunk for p in patterns])
+        if show:
+            cv2.destroyAllWindows()
+    return written
+
 def record_multi_source_chunks_json(
         save_dir="recordings",
-        json_file="videos.json",
+        json_file="videos.jsonl",
         total_duration=3600,
         chunk_duration=5,
         target_size=(224,224),
         phone1_url="http://172.30.58.20:8080/video",
-        phone2_url="http://172.30.58.210:8080/video"
+        phone2_url="http://172.30.58.210:8080/video",
+        show=True,
+        use_opencl=False
     ):
 
     os.makedirs(save_dir, exist_ok=True)
@@ -106,6 +601,8 @@ def record_multi_source_chunks_json(
     ]
 
     caps = []
+    cap_sources = []
+    cap_backends = []
     src_labels = []
 
     for i, src in enumerate(sources):
@@ -133,7 +630,7 @@ def record_multi_source_chunks_json(
         else:
             for backend in (cv2.CAP_FFMPEG, cv2.CAP_ANY):
                 try:
-                    cap = cv2.VideoCapture(src, backend)
+                    cap = _open_stream(src, backend)
                 except Exception:
                     cap = cv2.VideoCapture(src)
                 if cap is not None and cap.isOpened():
@@ -156,110 +653,60 @@ def record_multi_source_chunks_json(
         except Exception:
             pass
 
+        # ask webcams for MJPG at the target size so the driver does the
+        # downscale; workers only resize when the camera picks another mode
+        if isinstance(src, int):
+            try:
+                cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, target_size[0])
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, target_size[1])
+            except Exception:
+                pass
+
         caps.append(cap)
+        cap_sources.append(src)
+        cap_backends.append(backend)
         src_labels.append(_label_for_source(src, i))
 
     if not caps:
         print("Error: No video sources available.")
         return
 
+    _check_cpu_dispatch()
+    # OpenCL resizes pay an upload and download per frame, which only wins
+    # for large frames on an iGPU sharing host memory, so it is opt-in
+    use_opencl = use_opencl and cv2.ocl.haveOpenCL()
+    cv2.ocl.setUseOpenCL(use_opencl)
+    # every worker resizes on its own thread, so split OpenCV's pool between
+    # them instead of letting each source spin up one per core
+    cv2.setNumThreads(max(1, (os.cpu_count() or 1) // len(caps)))
+
     width, height = target_size
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     fps = 20.0
 
-    if os.path.exists(json_file):
-        try:
-            video_metadata = json.load(open(json_file, 'r'))
-        except:
-            video_metadata = []
-    else:
-        video_metadata = []
-
-    start_time = time.time()
-    print("Recording started. Press 'q' in any OpenCV window to stop.")
-
-    stop = False
-    try:
-        while (time.time() - start_time) < total_duration and not stop:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            file_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-            writers = []
-            paths = []
-            # create per-source folder and writer
-            for label in src_labels:
-                src_dir = os.path.join(save_dir, label)
-                os.makedirs(src_dir, exist_ok=True)
-                video_path = os.path.join(src_dir, f"{label}_{file_timestamp}.mp4")
-                out = cv2.VideoWriter(video_path, fourcc, fps, (width, height))
-                writers.append(out)
-                paths.append(video_path)
-
-            chunk_start = time.time()
-
-            while (time.time() - chunk_start) < chunk_duration and not stop:
-                frames = []
-                for cap_idx, cap in enumerate(caps):
-                    # suppress FFmpeg native stderr during read (hides "[mjpeg ...] overread" messages)
-                    with _suppress_stderr_fd():
-                        ret, frame = cap.read()
-
-                    if not ret or frame is None:
-                        # try a quick reconnect if stream fails
-                        src = sources[cap_idx]
-                        print(f"Warning: read failed for {src_labels[cap_idx]}, attempting reconnect...")
-                        try:
-                            # suppress FFmpeg stderr during reconnect/open as well
-                            cap.release()
-                            time.sleep(0.5)
-                            with _suppress_stderr_fd():
-                                try:
-                                    new_cap = cv2.VideoCapture(src, cv2.CAP_FFMPEG)
-                                except Exception:
-                                    new_cap = cv2.VideoCapture(src)
-                            try:
-                                new_cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                            except Exception:
-                                pass
-                            caps[cap_idx] = new_cap
-                            with _suppress_stderr_fd():
-                                ret, frame = new_cap.read()
-                        except Exception:
-                            ret = False
-
-                    if not ret or frame is None:
-                        # black placeholder on persistent failure
-                        frame = np.zeros((height, width, 3), dtype=np.uint8)
-                    else:
-                        frame = cv2.resize(frame, (width, height))
-                    writers[cap_idx].write(frame)
-                    cv2.imshow(f"Source {src_labels[cap_idx]}", frame)
-                    frames.append(frame)
-
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    stop = True
-                    break
-
-            # release writers for this chunk
-            for w in writers:
-                w.release()
-
-            # append metadata per source
-            for label, path in zip(src_labels, paths):
-                video_metadata.append({
-                    "timestamp": timestamp,
-                    "source": label,
-                    "path": path
-                })
-
-            with open(json_file, "w") as f:
-                json.dump(video_metadata, f, indent=4)
+    # chunks are cut by frame count so each file holds exactly chunk_duration of video
+    frames_per_chunk = max(1, round(chunk_duration * fps))
+    session_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    patterns = []
+    writers = []
+    # create per-source folder and writer
+    for label in src_labels:
+        src_dir = os.path.join(save_dir, label)
+        os.makedirs(src_dir, exist_ok=True)
+        pattern = os.path.join(src_dir, f"{label}_{session_timestamp}_%05d.mp4")
+        patterns.append(pattern)
+        writers.append(_open_chunk_writer(pattern, fps, (width, height), chunk_duration, frames_per_chunk))
+
+    workers = [
+        CameraWorker(src, cap, label, (width, height), use_opencl, backend)
+        for src, cap, label, backend in zip(cap_sources, caps, src_labels, cap_backends)
+    ]
+    for worker in workers:
+        worker.start()
 
-    finally:
-        for cap in caps:
-            cap.release()
-        cv2.destroyAllWindows()
-        print("Recording stopped. Files saved in:", save_dir)
+    _record(workers, writers, patterns, src_labels, json_file, (width, height), fps,
+            frames_per_chunk, total_duration, show)
+    print("Recording stopped. Files saved in:", save_dir)
 
 if __name__ == "__main__":
     record_multi_source_chunks_json()